@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import functools
+import hashlib
 import io
-import numpy as np
+import os
+import pyarrow.compute as pc
+import yaml
+from pipeline import (
+    CHECK_CODES, SEVERIDADE_NAO_APLICAVEL, SEVERIDADE_CONFORME, STATUS_NAO_APLICAVEL, STATUS_CONFORME,
+    ler_arquivo_perfil,
+)
+from armazenamento import analise_do_relatorio, exportar_csv, leitura_do_relatorio
 
 # --- TÍTULO DA PÁGINA E CONFIGURAÇÕES ---
 st.set_page_config(
@@ -27,262 +36,146 @@ except FileNotFoundError:
 
 # 3. TÍTULO PRINCIPAL
 st.title("RTGA - Rail Track Geometry Analyzer - TRIVIA 📊") 
-st.markdown("Análise de conformidade baseada nos **Limites de Tolerância da NBR 16387**.")
+st.markdown("Análise de conformidade baseada nos **Perfis de Limites de Tolerância** (ex.: NBR 16387).")
 
 # ====================================================================
-# !!! MAPA DE LIMITES POR CLASSE (Baseado na NBR 16387) !!!
-# (Conteúdo idêntico ao anterior)
-# ...
+# !!! PERFIS DE TOLERÂNCIA (Arquivos YAML/JSON na pasta 'perfis') !!!
+# Cada arquivo define as classes de via, os limites por parâmetro, as
+# traduções e os parâmetros ignorados de uma norma (ex.: NBR 16387).
+# Os arquivos são validados uma única vez, compilados em tabelas de
+# consulta baseadas em arrays e recarregados ao serem alterados.
 # ====================================================================
-LIMITS_MAP = {
-    'Classe 1 (0-25 km/h)': {
-        'Gage Wide': {'min': 1600, 'max': 1635, 'check': 'max'}, 
-        'Gage Narrow': {'min': 1587, 'max': 1635, 'check': 'min'}, 
-        'Crosslevel': {'min': -76, 'max': 76, 'check': 'abs_max'},
-        'Twist 3': {'min': 0, 'max': 51, 'check': 'max'}, 
-        'Twist 10': {'min': 0, 'max': 51, 'check': 'max'},
-        'L Align 20': {'min': -154, 'max': 154, 'check': 'abs_max'},
-        'R Align 20': {'min': -154, 'max': 154, 'check': 'abs_max'},
-        'L Vert 20': {'min': -76, 'max': 76, 'check': 'abs_max'},
-        'R Vert 20': {'min': -76, 'max': 76, 'check': 'abs_max'},
-        'L Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-        'R Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-    },
-    'Classe 2 (26-45 km/h)': {
-        'Gage Wide': {'min': 1600, 'max': 1632, 'check': 'max'}, 
-        'Gage Narrow': {'min': 1587, 'max': 1632, 'check': 'min'}, 
-        'Crosslevel': {'min': -70, 'max': 70, 'check': 'abs_max'},
-        'Twist 3': {'min': 0, 'max': 44, 'check': 'max'}, 
-        'Twist 10': {'min': 0, 'max': 44, 'check': 'max'},
-        'L Align 20': {'min': -128, 'max': 128, 'check': 'abs_max'},
-        'R Align 20': {'min': -128, 'max': 128, 'check': 'abs_max'},
-        'L Vert 20': {'min': -70, 'max': 70, 'check': 'abs_max'},
-        'R Vert 20': {'min': -70, 'max': 70, 'check': 'abs_max'},
-        'L Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-        'R Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'},
-    },
-    'Classe 3 (45-96 km/h)': {
-        'Gage Wide': {'min': 1600, 'max': 1632, 'check': 'max'}, 
-        'Gage Narrow': {'min': 1587, 'max': 1632, 'check': 'min'}, 
-        'Crosslevel': {'min': -57, 'max': 57, 'check': 'abs_max'},
-        'Twist 3': {'min': 0, 'max': 32, 'check': 'max'}, 
-        'Twist 10': {'min': 0, 'max': 32, 'check': 'max'},
-        'L Align 20': {'min': -93, 'max': 93, 'check': 'abs_max'},
-        'R Align 20': {'min': -93, 'max': 93, 'check': 'abs_max'},
-        'L Vert 20': {'min': -57, 'max': 57, 'check': 'abs_max'},
-        'R Vert 20': {'min': -57, 'max': 57, 'check': 'abs_max'},
-        'L Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-        'R Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-    },
-    'Classe 4 (96-128 km/h)': {
-        'Gage Wide': {'min': 1600, 'max': 1625, 'check': 'max'}, 
-        'Gage Narrow': {'min': 1587, 'max': 1625, 'check': 'min'}, 
-        'Crosslevel': {'min': -51, 'max': 51, 'check': 'abs_max'},
-        'Twist 3': {'min': 0, 'max': 25, 'check': 'max'}, 
-        'Twist 10': {'min': 0, 'max': 25, 'check': 'max'},
-        'L Align 20': {'min': -68, 'max': 68, 'check': 'abs_max'},
-        'R Align 20': {'min': -68, 'max': 68, 'check': 'abs_max'},
-        'L Vert 20': {'min': -51, 'max': 51, 'check': 'abs_max'},
-        'R Vert 20': {'min': -51, 'max': 51, 'check': 'abs_max'},
-        'L Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-        'R Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-    },
-    'Classe 5 (128+ km/h)': {
-        'Gage Wide': {'min': 1600, 'max': 1613, 'check': 'max'}, 
-        'Gage Narrow': {'min': 1587, 'max': 1613, 'check': 'min'}, 
-        'Crosslevel': {'min': -32, 'max': 32, 'check': 'abs_max'},
-        'Twist 3': {'min': 0, 'max': 19, 'check': 'max'}, 
-        'Twist 10': {'min': 0, 'max': 19, 'check': 'max'},
-        'L Align 20': {'min': -55, 'max': 55, 'check': 'abs_max'},
-        'R Align 20': {'min': -55, 'max': 55, 'check': 'abs_max'},
-        'L Vert 20': {'min': -32, 'max': 32, 'check': 'abs_max'},
-        'R Vert 20': {'min': -32, 'max': 32, 'check': 'abs_max'},
-        'L Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-        'R Gage Side Wear (115Re)': {'min': 0, 'max': 10, 'check': 'max'}, 
-    }
-}
-
-
-# --- MAPEAMENTO DE NOMES (Mantido) ---
-PARAMETER_TRANSLATIONS = {
-    'Gage Wide': 'Bitola Aberta (Estática)',
-    'Gage Narrow': 'Bitola Estreita (Estática)',
-    'Crosslevel': 'Desnivelamento (Nível)',
-    'Twist 3': 'Torção (3m) - Prox. ao Nível',
-    'Twist 10': 'Torção (10m) - Prox. ao Nível',
-    'L Align 20': 'Alinhamento Esquerdo (Flecha 20m)',
-    'R Align 20': 'Alinhamento Direito (Flecha 20m)',
-    'L Vert 20': 'Variação Vertical Esquerda (20m)',
-    'R Vert 20': 'Variação Vertical Direita (20m)',
-    'L Gage Side Wear (115Re)': 'Desgaste Lateral Esquerdo',
-    'R Gage Side Wear (115Re)': 'Desgaste Lateral Direito',
-}
-
-
-IGNORED_PARAMETERS = [
-    'Railroad', 'Subdivision', 'Tunnel Start', 'Tunnel End', 'Bridge End', 
-    'Bridge Start', 'Concrete Ties End', 'Concrete Ties Start', 
-    'Timber Ties End', 'Timber Ties Start', 'Rail Joint', 'Level Crossing',
-    'Switch/Frog', 'Up Kilometer', 'Down Kilometer', 'Track Change', 
-    'Class Change', 'Posted Speed' 
-]
-# ====================================================================
-
-
-# --- Mapeamentos e Constantes (Mantidos) ---
-COMPLEX_COL_MAP = {
-    0: 'KM', 3: 'M', 8: 'Parameter', 
-    26: 'Value_26', 27: 'Value_27', 28: 'Value_28',  
-    31: 'Length', 39: 'Speed', 44: 'TSC', 55: 'Track', 62: 'Peak Lat/Long'
-}
-COMPLEX_HEADER_ROW = 4
-
-SIMPLIFIED_REQUIRED_COLS = ['KM', 'M', 'Parameter', 'Value', 'Length', 'Speed', 'TSC', 'Track', 'Peak Lat', 'Peak Long']
-SIMPLIFIED_HEADER_ROW = 0 
-
-MAX_ROWS_TO_READ = 11000 
+PERFIS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfis")
+PERFIS_EXTENSOES = ('.yaml', '.yml', '.json')
 
+# Cores fixas dos códigos de severidade que não vêm do perfil (as dos níveis vêm do arquivo)
+CORES_STATUS_BASE = {STATUS_NAO_APLICAVEL: 'gray', STATUS_CONFORME: 'lightgray'}
 
-# --- Função para Análise de Conformidade (Mantida) ---
-def check_conformity(df, tolerance_limits):
-    """ Adiciona a coluna 'Status' e 'Delta' ao DataFrame baseado nos limites fornecidos. """
-    df['Status'] = 'Não Aplicável'
-    df['Delta'] = 0.0
-    
-    # Adiciona o nome em português para facilitar a visualização (feito aqui para ser aplicado a todas as linhas)
-    df['Parâmetro (Português)'] = df['Parameter'].apply(lambda p: PARAMETER_TRANSLATIONS.get(p, p))
-
-    for param, limits in tolerance_limits.items():
-        mask = df['Parameter'] == param
-        if df.loc[mask].empty: continue
-        
-        value_to_check = df.loc[mask, 'Value']
-        
-        if limits['check'] == 'max':
-            # === AJUSTE DE STATUS: Agora, só há 'Fora do Limite' e 'Em Conformidade (Próximo)' ===
-            df.loc[mask, 'Status'] = df.loc[mask, 'Value'].apply(lambda x: 'Fora do Limite' if x > limits['max'] else 'Em Conformidade (Próximo)')
-            df.loc[mask, 'Delta'] = df.loc[mask, 'Value'].apply(lambda x: x - limits['max'] if x > limits['max'] else 0)
-        elif limits['check'] == 'min':
-            df.loc[mask, 'Status'] = df.loc[mask, 'Value'].apply(lambda x: 'Fora do Limite' if x < limits['min'] else 'Em Conformidade (Próximo)')
-            df.loc[mask, 'Delta'] = df.loc[mask, 'Value'].apply(lambda x: limits['min'] - x if x < limits['min'] else 0)
-        elif limits['check'] == 'abs_max':
-            df.loc[mask, 'Status'] = value_to_check.apply(lambda x: 'Fora do Limite' if abs(x) > limits['max'] else 'Em Conformidade (Próximo)')
-            df.loc[mask, 'Delta'] = value_to_check.apply(lambda x: abs(x) - limits['max'] if abs(x) > limits['max'] else 0)
-            
-    # Preenche o nome em português para os demais, se existirem
-    df['Parâmetro (Português)'] = df['Parâmetro (Português)'].fillna(df['Parameter'])
 
-    return df
+def mapa_cores_status(perfil):
+    """ Cor de cada rótulo de Status (usada nos gráficos e no mapa). """
+    cores = dict(CORES_STATUS_BASE)
+    for nivel in perfil['severidade']:
+        cores[nivel['nome']] = nivel['cor'] or 'red'
+    return cores
 
 
-# --- Função Principal de Limpeza e Processamento (Mantida) ---
-@st.cache_data
-def processar_dados_ferrovia(uploaded_file, tolerance_limits):
-    
-    file_extension = uploaded_file.name.split('.')[-1].lower()
-    df_limpo = pd.DataFrame()
-    is_simplified = False
-    
-    # 1. TENTA LER O ARQUIVO NO FORMATO SIMPLIFICADO
+def assinatura_perfis(diretorio=PERFIS_DIR):
+    """ Assinatura (nome, mtime, tamanho) dos arquivos de perfil. Muda sempre que um arquivo é alterado. """
     try:
-        uploaded_file.seek(0)
-        
-        if file_extension == 'csv':
-            df_read = pd.read_csv(uploaded_file, sep=',', header=SIMPLIFIED_HEADER_ROW, engine='python', on_bad_lines='skip', nrows=MAX_ROWS_TO_READ, encoding='latin1')
-        elif file_extension == 'xlsx':
-            df_read = pd.read_excel(uploaded_file, header=SIMPLIFIED_HEADER_ROW, sheet_name=0, nrows=MAX_ROWS_TO_READ)
+        nomes = sorted(n for n in os.listdir(diretorio) if n.lower().endswith(PERFIS_EXTENSOES))
+    except FileNotFoundError:
+        return ()
 
-        df_read.columns = df_read.columns.str.strip() 
-        is_simplified = all(col in df_read.columns for col in ['Peak Lat', 'Peak Long', 'KM', 'Parameter'])
-        
-        if is_simplified:
-            df_limpo = df_read[df_read.columns.intersection(SIMPLIFIED_REQUIRED_COLS)].copy()
-            # MANTÉM AS COLUNAS SEPARADAS E AS LIMPA
-            for col in ['Peak Lat', 'Peak Long']:
-                if col in df_limpo.columns:
-                    df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
-            df_limpo = df_limpo.rename(columns={'Value': 'Value_26'}) 
-            
-        else:
-            pass
-            
-    except Exception:
-        is_simplified = False
+    assinatura = []
+    for nome in nomes:
+        try:
+            stat = os.stat(os.path.join(diretorio, nome))
+        except FileNotFoundError:
+            continue
+        assinatura.append((nome, stat.st_mtime_ns, stat.st_size))
+    return tuple(assinatura)
+
+
+@st.cache_resource(max_entries=1)
+def carregar_perfis(assinatura, diretorio=PERFIS_DIR):
+    """
+    Carrega, valida e compila todos os perfis. O cache é indexado pela assinatura
+    dos arquivos, então uma alteração em disco recarrega os perfis na próxima
+    interação, sem reiniciar o servidor e sem invalidar o cache de leitura do relatório.
+    """
+    perfis, erros = {}, []
+    for nome_arquivo, mtime, tamanho in assinatura:
+        caminho = os.path.join(diretorio, nome_arquivo)
+        try:
+            perfil = ler_arquivo_perfil(caminho)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            erros.append(f"{nome_arquivo}: {e}")
+            continue
+        # Versão do perfil: chave dos caches de dados processados
+        perfil['versao'] = (nome_arquivo, mtime, tamanho)
+        if perfil['nome'] in perfis:
+            erros.append(f"{nome_arquivo}: o perfil '{perfil['nome']}' já foi definido em '{perfis[perfil['nome']]['arquivo']}'.")
+            continue
+        perfis[perfil['nome']] = perfil
+    return perfis, erros
+# ====================================================================
 
 
-    # 2. TENTA LER O ARQUIVO NO FORMATO COMPLEXO
-    if not is_simplified:
-        try:
-            uploaded_file.seek(0) 
+# Relatórios abertos no servidor (compartilhados entre todas as sessões)
+MAX_RELATORIOS_EM_CACHE = 8
 
-            if file_extension == 'csv':
-                df = pd.read_csv(uploaded_file, sep=',', header=COMPLEX_HEADER_ROW, engine='python', on_bad_lines='skip', nrows=MAX_ROWS_TO_READ, encoding='latin1')
-            elif file_extension == 'xlsx':
-                df = pd.read_excel(uploaded_file, header=COMPLEX_HEADER_ROW, sheet_name=0, nrows=MAX_ROWS_TO_READ)
 
-            colunas_para_selecionar = list(COMPLEX_COL_MAP.keys())
-            df_limpo = df.iloc[:, colunas_para_selecionar].copy()
-            df_limpo.columns = COMPLEX_COL_MAP.values()
-            
-            # NO FORMATO COMPLEXO, DIVIDE Peak Lat/Long em duas colunas
-            df_limpo[['Peak Lat', 'Peak Long']] = df_limpo['Peak Lat/Long'].str.split(',', expand=True)
-            df_limpo = df_limpo.drop(columns=['Peak Lat/Long'], errors='ignore')
-            
-            # Limpa e converte as novas colunas de Lat/Long
-            for col in ['Peak Lat', 'Peak Long']:
-                 df_limpo[col] = df_limpo[col].astype(str).str.strip().str.replace(' ', '').str.replace(',', '.').str.replace('|', '', regex=False)
-                 df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+# --- Consultas sobre as Tabelas Arrow (Mapeadas em Memória) ---
+def fatia_top_n(tabela, mascara, coluna, n, decrescente=True):
+    """ Materializa (pandas) apenas as N primeiras linhas da seleção, ordenadas por 'coluna'. """
+    # Só a coluna de ordenação é lida para as linhas selecionadas; as demais, só para as N escolhidas
+    indices = pc.indices_nonzero(mascara)
+    ordem = pc.array_sort_indices(pc.take(tabela[coluna], indices), order='descending' if decrescente else 'ascending')
+    return tabela.take(pc.take(indices, ordem[:n])).to_pandas()
 
-        except Exception as complex_e:
-            st.error(f"Erro Crítico ao processar arquivo nos dois formatos. Verifique o cabeçalho. Detalhe: {complex_e}")
-            return None, None, None 
 
-    # --- Lógica de Limpeza Comum aos DOIS Formatos (Continuada) ---
-    if df_limpo.empty: return None, None, None
-    
-    all_raw_parameters = df_limpo['Parameter'].astype(str).str.strip().unique().tolist()
-    
-    df_limpo = df_limpo.dropna(subset=['Parameter'])
-    df_limpo['Parameter'] = df_limpo['Parameter'].astype(str).str.strip()
-    df_limpo = df_limpo[~df_limpo['Parameter'].isin(IGNORED_PARAMETERS)].copy()
+def contar(mascara):
+    """ Número de linhas selecionadas pela máscara. """
+    return pc.sum(mascara).as_py() or 0
 
-    value_cols = [col for col in df_limpo.columns if col.startswith('Value_')]
-    
-    for col in value_cols:
-        df_limpo[col] = df_limpo[col].astype(str).str.replace(' ', '').str.replace(',', '.').str.strip()
-        df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
-        
-    df_limpo['Value'] = df_limpo[value_cols].bfill(axis=1).iloc[:, 0]
-    
-    rows_before_value_filter = len(df_limpo)
-    
-    df_limpo = df_limpo.dropna(subset=['Value'])
-    
-    df_limpo['KM'] = pd.to_numeric(df_limpo['KM'], errors='coerce').fillna(0).astype(int)
-    df_limpo['M'] = pd.to_numeric(df_limpo['M'], errors='coerce').fillna(0).astype(int)
-    df_limpo['Localização'] = df_limpo['KM'].astype(str) + '+' + df_limpo['M'].astype(str).str.zfill(3)
-    
-    df_limpo = df_limpo.drop(columns=value_cols, errors='ignore')
 
-    df_limpo_analisado = check_conformity(df_limpo, tolerance_limits)
-    
-    # 3. Reconstrói Peak Lat/Long para exibição
-    # Isso é importante para que as colunas 'Peak Lat' e 'Peak Long' existam no DataFrame final
-    df_limpo_analisado['Peak Lat/Long'] = df_limpo_analisado['Peak Lat'].round(6).astype(str) + ',' + df_limpo_analisado['Peak Long'].round(6).astype(str)
+def valores_unicos(coluna, mascara=None):
+    """ Valores distintos (ordenados) de uma coluna da tabela, opcionalmente filtrada. """
+    if mascara is not None:
+        coluna = coluna.filter(mascara)
+    return sorted(pc.unique(coluna).to_pylist())
 
-    return df_limpo_analisado, rows_before_value_filter, all_raw_parameters 
+
+# --- Função de Leitura e Limpeza (Independente do Perfil de Tolerância) ---
+@st.cache_resource(max_entries=MAX_RELATORIOS_EM_CACHE)
+def ler_dados_ferrovia(chave_relatorio, _uploaded_file):
+    """
+    Lê o relatório e aplica a limpeza comum aos dois formatos. Não depende do
+    perfil de tolerância, então trocar de classe ou recarregar um perfil não
+    invalida este cache. O resultado é gravado em Arrow (indexado pelo conteúdo
+    do arquivo) e compartilhado, mapeado em memória, por todas as sessões.
+    """
+    try:
+        return leitura_do_relatorio(chave_relatorio, _uploaded_file)
+    except ValueError as e:
+        st.error(str(e))
+        return None
+
+
+# --- Função Principal de Processamento ---
+def chave_do_relatorio(uploaded_file):
+    """ Identifica o relatório pelo conteúdo: o mesmo arquivo enviado por sessões diferentes tem a mesma chave. """
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+
+@st.cache_resource(max_entries=MAX_RELATORIOS_EM_CACHE)
+def processar_dados_ferrovia(chave_relatorio, versao_perfil, selected_class, _uploaded_file, _perfil):
+    """
+    Aplica os parâmetros ignorados e os limites do perfil/classe selecionados sobre o relatório lido.
+    O resultado é gravado em Arrow e retornado como tabela mapeada em memória, compartilhada
+    (somente leitura) por todas as sessões; as sessões guardam apenas máscaras e fatias.
+    """
+    analise = analise_do_relatorio(
+        chave_relatorio, versao_perfil, selected_class, _perfil,
+        lambda: ler_dados_ferrovia(chave_relatorio, _uploaded_file),
+    )
+    if analise is None: return None
+    tabela_analisada, metadados = analise
+    return tabela_analisada, metadados['rows_before_value_filter'], metadados['all_raw_parameters'] 
 
 
 # --- Tabela de Correlação de Parâmetros (Mantida) ---
-def display_tolerance_table(selected_class):
-    """ Exibe a tabela de limites para a classe selecionada. """
+def display_tolerance_table(perfil, selected_class):
+    """ Exibe a tabela de limites para a classe selecionada do perfil. """
     st.subheader(f"Limites de Tolerância Atuais: {selected_class}")
     
-    limits_data = LIMITS_MAP[selected_class]
+    limits_data = perfil['limites'][selected_class]
+    tabela = perfil['tabelas'][selected_class]
 
     data = []
-    for param, limits in limits_data.items():
-        translation = PARAMETER_TRANSLATIONS.get(param, param)
+    for codigo, (param, limits) in enumerate(limits_data.items()):
+        translation = perfil['traducoes'].get(param, param)
         
         if limits['check'] == 'max':
             limit_display = f"Máx: {limits['max']} mm"
@@ -293,31 +186,71 @@ def display_tolerance_table(selected_class):
         else:
             limit_display = "N/A"
             
-        data.append({
+        row = {
             'Parâmetro (Inglês)': param,
             'Parâmetro (Português)': translation,
             f'Tolerância de Conformidade ({selected_class} - mm)': limit_display,
-        })
+        }
+
+        # Valor medido a partir do qual cada nível é atingido, a partir dos limiares já compilados
+        for indice, nivel in enumerate(perfil['severidade']):
+            if nivel['fracao'] == 1.0:
+                continue
+            limiar = tabela.limiares[codigo, indice]
+            if tabela.tipo_check[codigo] == CHECK_CODES['max']:
+                nivel_display = f"> {tabela.limite_max[codigo] + limiar:g} mm"
+            elif tabela.tipo_check[codigo] == CHECK_CODES['min']:
+                nivel_display = f"< {tabela.limite_min[codigo] - limiar:g} mm"
+            else:
+                nivel_display = f"> ±{tabela.limite_max[codigo] + limiar:g} mm"
+            row[f"{nivel['nome']} ({nivel['fracao']:.0%})"] = nivel_display
+
+        data.append(row)
     
     df_limits = pd.DataFrame(data)
     st.dataframe(df_limits, use_container_width=True, hide_index=True)
+    st.caption(
+        "Níveis de severidade (fração da faixa de tolerância): "
+        + " | ".join(f"{nivel['nome']}: {nivel['fracao']:.0%}" for nivel in perfil['severidade'])
+    )
 
 # ----------------------------------------------------
 # | SELEÇÃO DE CLASSE E INTERFACE PRINCIPAL |
 # ----------------------------------------------------
 
+# CARREGAMENTO DOS PERFIS (Recarregados automaticamente quando os arquivos mudam)
+perfis, erros_perfis = carregar_perfis(assinatura_perfis())
+for erro in erros_perfis:
+    st.error(f"Perfil de tolerância inválido (ignorado): {erro}")
+if not perfis:
+    st.error(f"Nenhum perfil de tolerância válido foi encontrado na pasta '{PERFIS_DIR}'.")
+    st.stop()
+
 # SELEÇÃO DINÂMICA
-classes = list(LIMITS_MAP.keys())
+nomes_perfis = list(perfis.keys())
+selected_profile = st.selectbox(
+    "Selecione o Perfil de Tolerância:", 
+    nomes_perfis,
+    key='profile_selector'
+)
+perfil_atual = perfis[selected_profile]
+
+classes = list(perfil_atual['limites'].keys())
+default_class = perfil_atual['classe_padrao']
 selected_class = st.selectbox(
-    "Selecione a Classe de Via da NBR 16387 para Análise:", 
+    f"Selecione a Classe de Via da {perfil_atual['nome']} para Análise:", 
     classes,
-    index=classes.index('Classe 3 (45-96 km/h)'), 
+    index=classes.index(default_class) if default_class in classes else 0, 
     key='class_selector'
 )
-current_limits = LIMITS_MAP[selected_class]
+current_limits = perfil_atual['limites'][selected_class]
+ignored_parameters = perfil_atual['ignorados']
+tabela_atual = perfil_atual['tabelas'][selected_class]
+codigo_limite = tabela_atual.codigo_limite
+cores_status = mapa_cores_status(perfil_atual)
 
 st.header("1. Tabela de Limites e Correlação")
-display_tolerance_table(selected_class)
+display_tolerance_table(perfil_atual, selected_class)
 
 # --- Upload e Processamento (Mantido) ---
 uploaded_file = st.file_uploader(
@@ -326,20 +259,21 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file is not None:
-    # PASSANDO OS LIMITES ATUAIS PARA A FUNÇÃO DE PROCESSAMENTO
-    result = processar_dados_ferrovia(uploaded_file, current_limits)
+    # PASSANDO OS LIMITES ATUAIS PARA A FUNÇÃO DE PROCESSAMENTO (resultado compartilhado entre sessões)
+    chave_relatorio = chave_do_relatorio(uploaded_file)
+    result = processar_dados_ferrovia(chave_relatorio, perfil_atual['versao'], selected_class, uploaded_file, perfil_atual)
     
     if result is not None:
-        df_limpo, rows_before_value_filter, all_raw_parameters = result
+        tabela_limpo, rows_before_value_filter, all_raw_parameters = result
 
-        if not df_limpo.empty:
-            st.success(f"Arquivo '{uploaded_file.name}' carregado e processado com **{len(df_limpo)} linhas de dados de medição válidos**.")
+        if tabela_limpo.num_rows > 0:
+            st.success(f"Arquivo '{uploaded_file.name}' carregado e processado com **{tabela_limpo.num_rows} linhas de dados de medição válidos**.")
             
-            rows_discarded = rows_before_value_filter - len(df_limpo)
+            rows_discarded = rows_before_value_filter - tabela_limpo.num_rows
             if rows_discarded > 0:
                  st.info(f"**Detalhe da Limpeza:** {rows_before_value_filter} linhas com Parâmetros de Geometria foram consideradas, mas **{rows_discarded} foram descartadas** por terem valores nulos ou não numéricos no campo 'Value'.")
             else:
-                 st.info(f"**Detalhe da Limpeza:** O filtro de Parâmetros de Identificação foi aplicado. Todas as {len(df_limpo)} linhas restantes têm valores numéricos válidos.")
+                 st.info(f"**Detalhe da Limpeza:** O filtro de Parâmetros de Identificação foi aplicado. Todas as {tabela_limpo.num_rows} linhas restantes têm valores numéricos válidos.")
 
             # --- FERRAMENTA DE DIAGNÓSTICO (Mantida) ---
             with st.expander("🛠️ Ferramenta de Diagnóstico: Parâmetros Encontrados no Arquivo"):
@@ -347,8 +281,8 @@ if uploaded_file is not None:
                 
                 # CORREÇÃO: Usando 'all_raw_parameters' em vez de 'all_limits.keys()'
                 geometry_params = [p for p in all_raw_parameters if p in current_limits.keys()] 
-                ignored_params = [p for p in all_raw_parameters if p in IGNORED_PARAMETERS]
-                other_params = [p for p in all_raw_parameters if p not in current_limits.keys() and p not in IGNORED_PARAMETERS]
+                ignored_params = [p for p in all_raw_parameters if p in ignored_parameters]
+                other_params = [p for p in all_raw_parameters if p not in current_limits.keys() and p not in ignored_parameters]
 
                 col_geom, col_ign = st.columns(2)
                 with col_geom:
@@ -362,7 +296,7 @@ if uploaded_file is not None:
 
                 if other_params:
                     st.subheader("❓ Outros Parâmetros Encontrados:")
-                    st.markdown("Se o seu relatório tem outras medições importantes, adicione-as à lista de limites no código `app.py`.")
+                    st.markdown("Se o seu relatório tem outras medições importantes, adicione-as ao arquivo do perfil na pasta `perfis/` (o perfil é recarregado automaticamente ao salvar).")
                     st.code('\n'.join(sorted(other_params)), language='text')
             
             # ----------------------------------------
@@ -370,35 +304,38 @@ if uploaded_file is not None:
             # ----------------------------------------
             st.header("3. Análise Global de Conformidade (Métricas)")
             
-            df_conformidade = df_limpo[df_limpo['Parameter'].isin(current_limits.keys())].copy()
-
-            if not df_conformidade.empty:
-                
-                metrics = df_conformidade.groupby('Parâmetro (Português)')['Status'].value_counts(normalize=True).mul(100).unstack(fill_value=0)
+            # Máscaras da sessão sobre a tabela Arrow mapeada: os filtros são varreduras de coluna
+            # sem cópia, e apenas as fatias exibidas (Top N, pontos do mapa) são materializadas.
+            severidade = tabela_limpo['Severidade']
+            parametro_pt = tabela_limpo['Parâmetro (Português)']
+            mascara_conformidade = pc.greater_equal(severidade, SEVERIDADE_CONFORME)
+            mascara_excecoes = pc.greater_equal(severidade, codigo_limite)
+
+            if contar(mascara_conformidade) > 0:
                 
-                # Novo: Renomear a coluna de "Em Conformidade (Próximo)" para algo mais conciso na métrica
-                if 'Em Conformidade (Próximo)' in metrics.columns:
-                    metrics = metrics.rename(columns={'Em Conformidade (Próximo)': 'Em Conformidade'})
+                # Contagem por código de severidade (colunas: Em Conformidade, nível 1, ..., nível N)
+                codigos_severidade = range(SEVERIDADE_CONFORME, len(tabela_atual.status) + SEVERIDADE_NAO_APLICAVEL)
+                contagens = tabela_limpo.select(['Parâmetro (Português)', 'Severidade']).filter(mascara_conformidade) \
+                    .group_by(['Parâmetro (Português)', 'Severidade']).aggregate([([], 'count_all')]).to_pandas()
+                contagens = contagens.pivot(index='Parâmetro (Português)', columns='Severidade', values='count_all')
+                contagens = contagens.reindex(columns=codigos_severidade).fillna(0)
+                metrics = contagens.div(contagens.sum(axis=1), axis=0).mul(100)
+                metrics.columns = [tabela_atual.status[c - SEVERIDADE_NAO_APLICAVEL] for c in codigos_severidade]
                 
-                metrics['Total Exceções'] = metrics.get('Fora do Limite', 0)
-                metrics = metrics[['Total Exceções']]
+                metrics['Total Exceções'] = metrics.iloc[:, codigo_limite:].sum(axis=1)
+                metrics = metrics.drop(columns=[STATUS_CONFORME])
                 metrics = metrics.sort_values(by='Total Exceções', ascending=False)
 
-                st.subheader("Porcentagem de Exceções (Fora do Limite) por Parâmetro")
-                st.dataframe(metrics.style.format({'Total Exceções': "{:.2f}%"}), use_container_width=True)
+                st.subheader("Porcentagem por Nível de Severidade e Total de Exceções (Fora do Limite) por Parâmetro")
+                st.dataframe(metrics.style.format("{:.2f}%"), use_container_width=True)
 
-                if 'Fora do Limite' in df_conformidade['Status'].unique():
+                if contar(mascara_excecoes) > 0:
                     
                     most_critical_param = metrics.index[0]
-                    df_pie = df_conformidade[df_conformidade['Parâmetro (Português)'] == most_critical_param]['Status'].value_counts().reset_index()
+                    mascara_pie = pc.and_(mascara_conformidade, pc.equal(parametro_pt, most_critical_param))
+                    df_pie = tabela_limpo.select(['Status']).filter(mascara_pie).to_pandas()['Status'].value_counts().reset_index()
                     df_pie.columns = ['Status', 'Contagem']
-
-                    # === NOVO MAPA DE CORES PARA GRÁFICO DE PIZZA (Sem Verde) ===
-                    color_map_pie = {
-                        'Fora do Limite':'red', 
-                        'Em Conformidade (Próximo)':'orange', # Mudando para Laranja/Amarelo
-                        'Não Aplicável': 'gray'
-                    }
+                    df_pie = df_pie[df_pie['Contagem'] > 0]
 
                     fig_pie = px.pie(
                         df_pie, 
@@ -406,7 +343,7 @@ if uploaded_file is not None:
                         names='Status', 
                         title=f'Conformidade para {most_critical_param}',
                         color='Status',
-                        color_discrete_map=color_map_pie,
+                        color_discrete_map=cores_status,
                         hole=.3
                     )
                     st.plotly_chart(fig_pie, use_container_width=True)
@@ -432,30 +369,28 @@ if uploaded_file is not None:
             with tab_conformidade:
                 st.subheader("Exceções que Mais Excederam o Limite (Rankeado por Delta)")
                 
-                df_excecoes = df_limpo[(df_limpo['Status'] == 'Fora do Limite') & (df_limpo['Delta'] > 0)].copy()
-
-                if not df_excecoes.empty:
+                if contar(mascara_excecoes) > 0:
                     
                     col3, col4 = st.columns([1, 1])
 
                     with col3:
-                        ex_params = sorted(df_excecoes['Parâmetro (Português)'].unique().tolist())
+                        ex_params = valores_unicos(parametro_pt, mascara_excecoes)
                         selected_param_delta = st.selectbox(
                             "Selecione o Parâmetro para Detalhamento:", 
                             ex_params, 
                             key='detailed_param'
                         )
+                    mascara_param_delta = pc.and_(mascara_excecoes, pc.equal(parametro_pt, selected_param_delta))
                     with col4:
                         num_top_delta = st.slider(
                             f"Mostrar os Top N Desvios mais Críticos (pelo Delta):", 
                             min_value=5, 
-                            max_value=min(100, len(df_excecoes[df_excecoes['Parâmetro (Português)'] == selected_param_delta])), 
+                            max_value=min(100, contar(mascara_param_delta)), 
                             value=20,
                             key='top_n_delta'
                         )
 
-                    df_criticos_delta = df_excecoes[df_excecoes['Parâmetro (Português)'] == selected_param_delta] \
-                        .sort_values(by='Delta', ascending=False).head(num_top_delta).reset_index(drop=True)
+                    df_criticos_delta = fatia_top_n(tabela_limpo, mascara_param_delta, 'Delta', num_top_delta)
                     
                     
                     if not df_criticos_delta.empty:
@@ -489,10 +424,11 @@ if uploaded_file is not None:
                 col5, col6 = st.columns([1, 1])
 
                 with col5:
-                    tipos_de_parametro = sorted(df_limpo['Parâmetro (Português)'].unique().tolist())
+                    tipos_de_parametro = valores_unicos(parametro_pt)
                     default_index = 0
-                    if PARAMETER_TRANSLATIONS['Gage Wide'] in tipos_de_parametro:
-                        default_index = tipos_de_parametro.index(PARAMETER_TRANSLATIONS['Gage Wide'])
+                    default_param = perfil_atual['traducoes'].get('Gage Wide', 'Gage Wide')
+                    if default_param in tipos_de_parametro:
+                        default_index = tipos_de_parametro.index(default_param)
                         
                     selected_param_value = st.selectbox(
                         "Selecione o Parâmetro de Interesse:", 
@@ -509,18 +445,18 @@ if uploaded_file is not None:
                         key='ordenacao_value'
                     )
                 
-                df_filtrado_value = df_limpo[df_limpo['Parâmetro (Português)'] == selected_param_value].copy()
+                mascara_param_value = pc.equal(parametro_pt, selected_param_value)
                 num_top_value = st.slider(
                     f"Mostrar os Top N ({selected_param_value}):", 
                     min_value=5, 
-                    max_value=min(200, len(df_filtrado_value)), 
+                    max_value=min(200, contar(mascara_param_value)), 
                     value=20,
                     key='top_n_value'
                 )
 
                 is_ascending_value = True if ordenacao_value == "Menores Valores" else False
                 
-                df_criticos_value = df_filtrado_value.sort_values(by='Value', ascending=is_ascending_value).head(num_top_value).reset_index(drop=True)
+                df_criticos_value = fatia_top_n(tabela_limpo, mascara_param_value, 'Value', num_top_value, decrescente=not is_ascending_value)
                 
                 
                 if not df_criticos_value.empty:
@@ -558,21 +494,20 @@ if uploaded_file is not None:
                     horizontal=True
                 )
 
-                # Base DataFrame: Todos os pontos de GEOMETRIA com coordenadas válidas
-                df_valid_coords = df_limpo[
-                    (df_limpo['Peak Lat'].notna()) & 
-                    (df_limpo['Peak Long'].notna()) &
-                    (df_limpo['Parameter'].isin(current_limits.keys()))
-                ].copy()
+                # Máscara base: Todos os pontos de GEOMETRIA com coordenadas válidas
+                mascara_coords = pc.and_(
+                    pc.and_(pc.is_finite(tabela_limpo['Peak Lat']), pc.is_finite(tabela_limpo['Peak Long'])),
+                    mascara_conformidade
+                )
                 
-                if df_valid_coords.empty:
+                if contar(mascara_coords) == 0:
                     st.warning("Não há dados de geometria com coordenadas válidas para serem exibidos no mapa.")
                 else:
                     col_param, col_placeholder = st.columns([1, 1])
 
                     # 2. Seletor de Parâmetro para o Mapa (Aplica-se a ambos os modos)
                     with col_param:
-                        map_params = sorted(df_valid_coords['Parâmetro (Português)'].unique().tolist())
+                        map_params = valores_unicos(parametro_pt, mascara_coords)
                         selected_map_param = st.selectbox(
                             "Filtrar no Mapa pelo Parâmetro:", 
                             ['Todos os Parâmetros'] + map_params, 
@@ -581,16 +516,13 @@ if uploaded_file is not None:
                     
                     # Aplica o filtro de Parâmetro
                     if selected_map_param != 'Todos os Parâmetros':
-                        df_base_filtered = df_valid_coords[df_valid_coords['Parâmetro (Português)'] == selected_map_param].copy()
+                        mascara_base = pc.and_(mascara_coords, pc.equal(parametro_pt, selected_map_param))
                     else:
-                        df_base_filtered = df_valid_coords.copy()
+                        mascara_base = mascara_coords
                         
-                    # 3. Aplica o Filtro de Modo
+                    # 3. Aplica o Filtro de Modo (apenas os pontos do mapa são materializados)
                     if map_mode == "Apenas Exceções (Foco em Problemas)":
-                        df_mapa_final = df_base_filtered[
-                            (df_base_filtered['Status'] == 'Fora do Limite') & 
-                            (df_base_filtered['Delta'] > 0)
-                        ].copy()
+                        df_mapa_final = tabela_limpo.filter(pc.and_(mascara_base, mascara_excecoes)).to_pandas()
                         
                         color_col = 'Delta'
                         color_continuous_scale = px.colors.sequential.Inferno_r # Escala de calor para severidade
@@ -599,19 +531,12 @@ if uploaded_file is not None:
                         size_col = 'Delta'
                         
                     else: # Nuvem Completa de Pontos (Todos os Status) - Foco na Severidade Relativa
-                        df_mapa_final = df_base_filtered.copy()
-                        
-                        # Coluna que combina a cor
-                        df_mapa_final['Severidade_Cor'] = df_mapa_final['Status'].apply(lambda x: 'Fora do Limite' if x == 'Fora do Limite' else 'Quase Limite/Outros')
+                        df_mapa_final = tabela_limpo.filter(mascara_base).to_pandas()
                         
-                        color_col = 'Severidade_Cor' # Usar coluna discreta
+                        # Cor discreta pelo nível de severidade (Cinza para "normal", Amarelo -> Vermelho para problema)
+                        color_col = 'Status'
                         color_continuous_scale = None 
-                        
-                        # Novo Mapeamento: Cinza para "normal", Amarelo/Vermelho para problema
-                        color_discrete_map = {
-                            'Fora do Limite da norma': 'red', 
-                            'Fora do Limite': 'yellow'
-                        }
+                        color_discrete_map = cores_status
                         
                         # Para o hover, se for "Quase Limite/Outros", é importante ver o Delta mesmo que seja 0
                         hover_data_list = ['Parâmetro (Português)', 'Value', 'Status', 'Delta'] 
@@ -688,6 +613,7 @@ if uploaded_file is not None:
                                 lon="Peak Long",
                                 color=color_col, 
                                 color_discrete_map=color_discrete_map,
+                                category_orders={'Status': list(tabela_atual.status)},
                                 hover_name="Localização",
                                 hover_data=hover_data_list + ['Track', 'TSC', 'Peak Lat/Long'],
                                 zoom=zoom_level, 
@@ -713,10 +639,9 @@ if uploaded_file is not None:
             # ----------------------------------------
             # | Download |
             # ----------------------------------------
-            csv_export = df_limpo.to_csv(index=False).encode('utf-8')
             st.download_button(
                 label="📥 Download de TODOS os Dados LIMPOS e ANALISADOS (CSV)",
-                data=csv_export,
+                data=functools.partial(exportar_csv, chave_relatorio, perfil_atual['versao'], selected_class, tabela_limpo),
                 file_name='dados_supervia_analisados_conformidade.csv',
                 mime='text/csv',
             )
@@ -0,0 +1,203 @@
+"""
+Conjunto de trabalho do RTGA em disco: relatórios lidos e análises gravados em Arrow IPC
+e abertos mapeados em memória, sem dependência do Streamlit. O app.py guarda o resultado
+destas funções em st.cache_resource; os testes em tests/ usam o mesmo caminho.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import weakref
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import pipeline
+from pipeline import analisar_relatorio, ler_relatorio
+
+# Dados lidos/analisados gravados em Arrow IPC (Feather v2, sem compressão) e
+# abertos mapeados em memória: apenas as fatias usadas são carregadas na RAM.
+# O diretório pertence ao aplicativo (altere com RTGA_DADOS_DIR) e RTGA_DADOS_MAX_MB
+# é um limite brando: os arquivos usados há mais tempo saem primeiro, mas os que ainda
+# estão mapeados por esta execução (no st.cache_resource do app) só saem depois de
+# liberados, e o diretório pode passar do limite enquanto isso.
+ARQUIVOS_ARROW_DIR = os.environ.get('RTGA_DADOS_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'rtga', 'processados')
+MAX_BYTES_ARQUIVOS_ARROW = int(os.environ.get('RTGA_DADOS_MAX_MB', '1024')) * 1024 * 1024
+COLUNAS_LEITURA = ['Parameter', 'Value', 'KM', 'M', 'Localização', 'Peak Lat', 'Peak Long']
+COLUNAS_ANALISE = COLUNAS_LEITURA + ['Severidade', 'Status', 'Delta', 'Parâmetro (Português)', 'Peak Lat/Long']
+
+
+def versao_do_codigo():
+    """ Hash do código que produz os arquivos (pipeline.py e este módulo) e das versões do pandas/pyarrow. """
+    resumo = hashlib.sha256(f"{pd.__version__}|{pa.__version__}".encode())
+    for arquivo in (pipeline.__file__, __file__):
+        with open(arquivo, 'rb') as f:
+            resumo.update(f.read())
+    return resumo.hexdigest()[:16]
+
+
+# Versão dos arquivos gravados: entra no nome dos arquivos e é conferida ao abrir.
+# Muda sozinha com o código da leitura/análise, sem incremento manual.
+VERSAO_ARQUIVOS_ARROW = versao_do_codigo()
+
+# Tabelas abertas por esta execução, por caminho: enquanto alguma estiver em uso, a
+# limpeza não remove o arquivo (removê-lo não liberaria o disco enquanto ele estiver mapeado).
+_TABELAS_MAPEADAS = weakref.WeakValueDictionary()
+
+
+# --- Arquivos Arrow (Mapeados em Memória) ---
+def caminho_arquivo_arrow(chave_relatorio, *variante, extensao='arrow'):
+    """ Caminho do arquivo de um relatório (leitura) ou de uma análise (perfil/classe), na versão atual do código. """
+    sufixo = hashlib.sha256(repr((VERSAO_ARQUIVOS_ARROW, variante)).encode()).hexdigest()[:16]
+    return os.path.join(ARQUIVOS_ARROW_DIR, f"{chave_relatorio}.{sufixo}.{extensao}")
+
+
+def diretorio_arrow():
+    """ Cria o diretório dos arquivos (modo 0700) e confirma que ele pertence ao usuário do aplicativo. """
+    os.makedirs(ARQUIVOS_ARROW_DIR, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        info = os.lstat(ARQUIVOS_ARROW_DIR)
+        if os.path.islink(ARQUIVOS_ARROW_DIR) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f"O diretório '{ARQUIVOS_ARROW_DIR}' deve pertencer ao usuário do aplicativo, sem acesso para outros usuários (modo 0700).")
+    return ARQUIVOS_ARROW_DIR
+
+
+def limpar_arquivos_arrow(manter):
+    """ Remove os arquivos usados há mais tempo até o diretório caber em MAX_BYTES_ARQUIVOS_ARROW. """
+    arquivos = []
+    for entrada in os.scandir(ARQUIVOS_ARROW_DIR):
+        if entrada.path == manter or entrada.path in _TABELAS_MAPEADAS:
+            continue
+        if entrada.name.endswith(('.arrow', '.csv')) and entrada.is_file(follow_symlinks=False):
+            info = entrada.stat(follow_symlinks=False)
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos) + os.path.getsize(manter)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= MAX_BYTES_ARQUIVOS_ARROW:
+            break
+        # Sessões de outros processos que já mapearam o arquivo continuam com acesso a ele
+        try:
+            os.remove(caminho)
+        except OSError:
+            continue  # em uso (Windows) ou já removido por outro processo
+        total -= tamanho
+
+
+def gravar_atomico(caminho, gravar):
+    """ Grava em um temporário no mesmo diretório e renomeia: nenhuma sessão lê um arquivo incompleto. """
+    with tempfile.NamedTemporaryFile(dir=diretorio_arrow(), suffix='.tmp', delete=False) as f:
+        temporario = f.name
+    try:
+        gravar(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        # Se a gravação falhar, o temporário não fica para trás
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    limpar_arquivos_arrow(manter=caminho)
+
+
+def marcar_uso(caminho):
+    """ Atualiza o mtime do arquivo para a limpeza (os menos usados recentemente saem primeiro). """
+    try:
+        os.utime(caminho)
+    except FileNotFoundError:
+        pass  # removido por outra sessão depois de aberto; quem o abriu continua com acesso
+
+
+def gravar_arrow(df, caminho, metadados):
+    """ Grava o DataFrame como Arrow IPC sem compressão (requisito para o mapeamento sem cópia). """
+    df = df.copy(deep=False)
+    # Colunas de texto com tipos misturados (comum em .xlsx) são gravadas como texto
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    metadados = {**metadados, 'versao': VERSAO_ARQUIVOS_ARROW}
+    tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, b'rtga': json.dumps(metadados).encode('utf-8')})
+    gravar_atomico(caminho, lambda destino: feather.write_feather(tabela, destino, compression='uncompressed'))
+
+
+def abrir_arrow(caminho, colunas):
+    """
+    Abre o arquivo Arrow mapeado em memória, retornando a tabela e os metadados gravados com ela.
+    Retorna None (o arquivo deve ser reconstruído) se ele não existir, não abrir, for de outra
+    versão do código ou não tiver as colunas esperadas.
+    """
+    try:
+        tabela = feather.read_table(caminho, memory_map=True)
+        metadados = json.loads(tabela.schema.metadata[b'rtga'])
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+    if metadados.get('versao') != VERSAO_ARQUIVOS_ARROW or not set(colunas) <= set(tabela.column_names):
+        return None
+
+    _TABELAS_MAPEADAS[caminho] = tabela
+    marcar_uso(caminho)
+    return tabela, metadados
+
+
+# --- Leitura e Análise com Gravação em Disco ---
+def leitura_do_relatorio(chave_relatorio, arquivo):
+    """
+    Relatório lido e limpo (tabela, metadados), reaproveitado do disco quando possível.
+    Retorna None se o arquivo não tiver linhas; lança ValueError se não puder ser lido.
+    """
+    caminho = caminho_arquivo_arrow(chave_relatorio)
+    leitura = abrir_arrow(caminho, COLUNAS_LEITURA)
+    if leitura is None:
+        resultado = ler_relatorio(arquivo)
+        if resultado is None: return None
+        df_limpo, all_raw_parameters = resultado
+        gravar_arrow(df_limpo, caminho, {'all_raw_parameters': all_raw_parameters})
+        leitura = abrir_arrow(caminho, COLUNAS_LEITURA)
+    return leitura
+
+
+def analise_do_relatorio(chave_relatorio, versao_perfil, classe, perfil, obter_leitura):
+    """
+    Análise do relatório para o perfil/classe (tabela, metadados), reaproveitada do disco quando
+    possível. 'obter_leitura' só é chamada se a análise precisar ser refeita.
+    """
+    caminho = caminho_arquivo_arrow(chave_relatorio, versao_perfil, classe)
+    analise = abrir_arrow(caminho, COLUNAS_ANALISE)
+    if analise is None:
+        leitura = obter_leitura()
+        if leitura is None: return None
+        tabela_lida, metadados_leitura = leitura
+        df_limpo_analisado, rows_before_value_filter = analisar_relatorio(
+            tabela_lida.to_pandas(), perfil['tabelas'][classe], perfil['traducoes'], perfil['ignorados']
+        )
+
+        gravar_arrow(df_limpo_analisado, caminho, {
+            'rows_before_value_filter': rows_before_value_filter,
+            'all_raw_parameters': metadados_leitura['all_raw_parameters'],
+        })
+        analise = abrir_arrow(caminho, COLUNAS_ANALISE)
+    return analise
+
+
+def exportar_csv(chave_relatorio, versao_perfil, selected_class, tabela):
+    """
+    CSV de download, gerado só quando o usuário pede o arquivo. É gravado lote a lote ao lado
+    do arquivo Arrow da análise (sem montar o CSV inteiro na memória) e reaproveitado pelas sessões.
+    """
+    caminho = caminho_arquivo_arrow(chave_relatorio, versao_perfil, selected_class, extensao='csv')
+    try:
+        with open(caminho, 'rb') as f:
+            dados = f.read()
+    except FileNotFoundError:
+        pass  # ainda não gerado, ou removido pela limpeza de outra sessão
+    else:
+        marcar_uso(caminho)
+        return dados
+
+    def gravar(destino):
+        with open(destino, 'w', encoding='utf-8', newline='') as f:
+            for i, lote in enumerate(tabela.to_batches()):
+                lote.to_pandas().to_csv(f, index=False, header=(i == 0))
+    gravar_atomico(caminho, gravar)
+    with open(caminho, 'rb') as f:
+        return f.read()
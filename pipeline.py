@@ -0,0 +1,354 @@
+"""
+Leitura dos relatórios e análise de conformidade do RTGA, sem dependência do Streamlit.
+Usado pelo app.py (interface) e pelos testes em tests/.
+"""
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+import yaml
+from typing import NamedTuple
+from _plotly_utils.basevalidators import ColorValidator
+
+# Códigos inteiros do tipo de verificação (usados nas tabelas compiladas)
+CHECK_CODES = {'max': 0, 'min': 1, 'abs_max': 2}
+
+# ====================================================================
+# NÍVEIS DE SEVERIDADE
+# Cada nível é uma fração da faixa de tolerância do parâmetro
+# (max - min para 'max'/'min'; max para 'abs_max'). A fração 1.0 é o
+# próprio limite: a partir dela a medição está Fora do Limite.
+# Código de severidade: -1 = Não Aplicável, 0 = Em Conformidade,
+# 1..N = índice do nível atingido (ordem crescente de fração).
+# ====================================================================
+SEVERIDADE_NAO_APLICAVEL = -1
+SEVERIDADE_CONFORME = 0
+STATUS_NAO_APLICAVEL = 'Não Aplicável'
+STATUS_CONFORME = 'Em Conformidade'
+
+NIVEIS_SEVERIDADE_PADRAO = [
+    {'nome': 'Atenção (Próximo ao Limite)', 'fracao': 0.8, 'cor': 'gold'},
+    {'nome': 'Fora do Limite', 'fracao': 1.0, 'cor': 'orangered'},
+    {'nome': 'Fora do Limite (Urgente)', 'fracao': 1.2, 'cor': 'darkred'},
+]
+
+# Casas decimais (mm) usadas ao comparar o excesso com os limiares dos níveis. Sem o
+# arredondamento, 1632 + (1.2 - 1) * 32 vira 1638.4000000000001 e uma leitura de 1638.4
+# (o valor exibido na tabela de limites) passaria a atingir o nível de 120%.
+CASAS_DECIMAIS_LIMIARES = 9
+
+
+class TabelaLimites(NamedTuple):
+    """ Tabela de limites compilada: a posição em 'parametros' é o código do parâmetro. """
+    parametros: pd.Index
+    limite_min: np.ndarray
+    limite_max: np.ndarray
+    tipo_check: np.ndarray
+    limiares: np.ndarray  # (parâmetro, nível): excesso ao limite (mm) a partir do qual o nível é atingido
+    status: tuple  # Rótulo de cada código de severidade, a partir de SEVERIDADE_NAO_APLICAVEL
+    codigo_limite: int  # Código de severidade do nível 'fracao = 1.0' (Fora do Limite)
+
+
+def faixa_tolerancia(limites):
+    """ Faixa de tolerância de um parâmetro: 'max' para 'abs_max', 'max' - 'min' nos demais. """
+    if limites['check'] == 'abs_max':
+        return limites['max']
+    return limites['max'] - limites['min']
+
+
+def compilar_tabela_limites(limites_classe, niveis):
+    """ Converte o dicionário {parâmetro: {min, max, check}} e os níveis de severidade em arrays indexados por código. """
+    parametros = list(limites_classe.keys())
+    limite_min = np.array([limites_classe[p]['min'] for p in parametros], dtype=float)
+    limite_max = np.array([limites_classe[p]['max'] for p in parametros], dtype=float)
+    tipo_check = np.array([CHECK_CODES[limites_classe[p]['check']] for p in parametros], dtype=np.int8)
+
+    # Faixa de tolerância de cada parâmetro e limiares de cada nível, em excesso ao limite
+    faixa = np.array([faixa_tolerancia(limites_classe[p]) for p in parametros], dtype=float)
+    fracoes = np.array([nivel['fracao'] for nivel in niveis], dtype=float)
+    limiares = np.round(np.outer(faixa, fracoes - 1.0), CASAS_DECIMAIS_LIMIARES)
+
+    return TabelaLimites(
+        parametros=pd.Index(parametros),
+        limite_min=limite_min,
+        limite_max=limite_max,
+        tipo_check=tipo_check,
+        limiares=limiares,
+        status=(STATUS_NAO_APLICAVEL, STATUS_CONFORME) + tuple(nivel['nome'] for nivel in niveis),
+        codigo_limite=[nivel['fracao'] for nivel in niveis].index(1.0) + 1,
+    )
+
+
+def validar_perfil(dados):
+    """ Valida a estrutura de um perfil lido do arquivo. Lança ValueError com o detalhe do problema. """
+    if not isinstance(dados, dict):
+        raise ValueError("O conteúdo deve ser um mapeamento (chave: valor).")
+
+    classes = dados.get('classes')
+    if classes is not None and not isinstance(classes, dict):
+        raise ValueError("'classes' deve ser um mapeamento (classe: parâmetros).")
+    if not classes:
+        raise ValueError("A chave 'classes' é obrigatória e não pode estar vazia.")
+
+    for classe, limites_classe in classes.items():
+        if not isinstance(limites_classe, dict) or not limites_classe:
+            raise ValueError(f"A classe '{classe}' não define nenhum parâmetro.")
+        for param, limites in limites_classe.items():
+            local = f"'{classe}' / '{param}'"
+            if not isinstance(limites, dict):
+                raise ValueError(f"{local} deve conter 'min', 'max' e 'check'.")
+            if limites.get('check') not in CHECK_CODES:
+                raise ValueError(f"{local}: 'check' deve ser um de {list(CHECK_CODES)}.")
+            for chave in ('min', 'max'):
+                valor = limites.get(chave)
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+                    raise ValueError(f"{local}: '{chave}' deve ser um número finito.")
+            if limites['min'] > limites['max']:
+                raise ValueError(f"{local}: 'min' ({limites['min']}) maior que 'max' ({limites['max']}).")
+
+    classe_padrao = dados.get('classe_padrao')
+    if classe_padrao is not None and classe_padrao not in classes:
+        raise ValueError(f"'classe_padrao' ('{classe_padrao}') não está entre as classes definidas.")
+
+    traducoes = dados.get('traducoes', {}) or {}
+    if not isinstance(traducoes, dict):
+        raise ValueError("'traducoes' deve ser um mapeamento (Inglês: Português).")
+
+    ignorados = dados.get('ignorados', []) or []
+    if not isinstance(ignorados, list):
+        raise ValueError("'ignorados' deve ser uma lista de parâmetros.")
+
+    niveis = dados.get('severidade')
+    if niveis is not None:
+        if not isinstance(niveis, list) or not niveis:
+            raise ValueError("'severidade' deve ser uma lista de níveis (nome, fracao, cor).")
+        nomes, fracoes = [], []
+        for nivel in niveis:
+            if not isinstance(nivel, dict) or 'nome' not in nivel or 'fracao' not in nivel:
+                raise ValueError("Cada nível de 'severidade' deve conter 'nome' e 'fracao'.")
+            fracao = nivel['fracao']
+            if isinstance(fracao, bool) or not isinstance(fracao, (int, float)) or not math.isfinite(fracao) or fracao <= 0:
+                raise ValueError(f"Nível '{nivel['nome']}': 'fracao' deve ser um número positivo.")
+            # Mesmo validador de cores do plotly: uma cor inválida falharia só ao desenhar os gráficos
+            cor = nivel.get('cor')
+            if cor is not None and ColorValidator.perform_validate_coerce(cor) is None:
+                raise ValueError(f"Nível '{nivel['nome']}': 'cor' ('{cor}') não é uma cor válida (nome CSS, '#rrggbb' ou 'rgb(r, g, b)').")
+            nomes.append(str(nivel['nome']))
+            fracoes.append(fracao)
+        if any(b <= a for a, b in zip(fracoes, fracoes[1:])):
+            raise ValueError("Os níveis de 'severidade' devem estar em ordem crescente de 'fracao'.")
+        if 1.0 not in fracoes:
+            raise ValueError("'severidade' deve conter o nível do próprio limite ('fracao: 1.0').")
+        if len(set(nomes)) != len(nomes) or {STATUS_NAO_APLICAVEL, STATUS_CONFORME} & set(nomes):
+            raise ValueError(f"Os nomes dos níveis de 'severidade' devem ser únicos e diferentes de '{STATUS_NAO_APLICAVEL}' e '{STATUS_CONFORME}'.")
+
+    # Níveis diferentes de 1.0 são frações da faixa: com faixa nula todos colapsariam no próprio limite
+    if any(nivel['fracao'] != 1.0 for nivel in (niveis or NIVEIS_SEVERIDADE_PADRAO)):
+        for classe, limites_classe in classes.items():
+            for param, limites in limites_classe.items():
+                if faixa_tolerancia(limites) <= 0:
+                    raise ValueError(f"'{classe}' / '{param}': faixa de tolerância nula; os níveis de 'severidade' exigem 'min' < 'max' (ou 'max' > 0 em 'abs_max').")
+
+
+def ler_arquivo_perfil(caminho):
+    """ Lê e valida um arquivo de perfil, retornando o perfil já compilado. """
+    with open(caminho, encoding='utf-8') as f:
+        if caminho.lower().endswith('.json'):
+            dados = json.load(f)
+        else:
+            dados = yaml.safe_load(f)
+
+    origem = os.path.basename(caminho)
+    validar_perfil(dados)
+
+    classes = dados['classes']
+    niveis = [
+        {'nome': str(nivel['nome']), 'fracao': float(nivel['fracao']), 'cor': nivel.get('cor')}
+        for nivel in (dados.get('severidade') or NIVEIS_SEVERIDADE_PADRAO)
+    ]
+    return {
+        'nome': str(dados.get('nome', os.path.splitext(origem)[0])),
+        'arquivo': origem,
+        'classe_padrao': dados.get('classe_padrao'),
+        'limites': classes,
+        'tabelas': {classe: compilar_tabela_limites(limites, niveis) for classe, limites in classes.items()},
+        'severidade': niveis,
+        'traducoes': {str(k): str(v) for k, v in (dados.get('traducoes') or {}).items()},
+        'ignorados': [str(p) for p in (dados.get('ignorados') or [])],
+    }
+
+
+# --- Mapeamentos e Constantes (Mantidos) ---
+COMPLEX_COL_MAP = {
+    0: 'KM', 3: 'M', 8: 'Parameter', 
+    26: 'Value_26', 27: 'Value_27', 28: 'Value_28',  
+    31: 'Length', 39: 'Speed', 44: 'TSC', 55: 'Track', 62: 'Peak Lat/Long'
+}
+COMPLEX_HEADER_ROW = 4
+
+SIMPLIFIED_REQUIRED_COLS = ['KM', 'M', 'Parameter', 'Value', 'Length', 'Speed', 'TSC', 'Track', 'Peak Lat', 'Peak Long']
+SIMPLIFIED_HEADER_ROW = 0 
+
+MAX_ROWS_TO_READ = 11000 
+
+
+# --- Função para Análise de Conformidade (Vetorizada sobre a Tabela de Limites) ---
+def check_conformity(df, tabela_limites, traducoes):
+    """
+    Adiciona as colunas 'Severidade', 'Status' e 'Delta' ao DataFrame baseado na tabela de limites compilada.
+
+    Regras de 'Fora do Limite' e 'Delta' (idênticas à versão original, congelada em tests/oracle.py):
+      - 'max':     Value > max      -> Delta = Value - max
+      - 'min':     Value < min      -> Delta = min - Value
+      - 'abs_max': |Value| > max    -> Delta = |Value| - max
+    Um valor igual ao limite está em conformidade; dentro do limite Delta = 0, e parâmetros
+    sem limite na tabela ficam 'Não Aplicável' (Severidade -1, Delta 0).
+    """
+    # Código do parâmetro na tabela (-1 = sem limite definido)
+    codigos = tabela_limites.parametros.get_indexer(df['Parameter'])
+    aplicavel = codigos >= 0
+    codigos_aplicaveis = codigos[aplicavel]
+
+    valores = df['Value'].to_numpy(dtype=float)[aplicavel]
+    tipo_check = tabela_limites.tipo_check[codigos_aplicaveis]
+    limite_min = tabela_limites.limite_min[codigos_aplicaveis]
+    limite_max = tabela_limites.limite_max[codigos_aplicaveis]
+
+    # Excesso ao limite para cada tipo de verificação (positivo = Fora do Limite)
+    excesso = np.select(
+        [tipo_check == CHECK_CODES['max'], tipo_check == CHECK_CODES['min']],
+        [valores - limite_max, limite_min - valores],
+        default=np.abs(valores) - limite_max,
+    )
+
+    # Código de severidade: quantos limiares do parâmetro o excesso ultrapassa
+    # (equivale a np.digitize(excesso arredondado, limiares, right=True) linha a linha)
+    severidade = np.full(len(df), SEVERIDADE_NAO_APLICAVEL, dtype=np.int8)
+    excesso_arredondado = np.round(excesso, CASAS_DECIMAIS_LIMIARES)
+    severidade[aplicavel] = (excesso_arredondado[:, None] > tabela_limites.limiares[codigos_aplicaveis]).sum(axis=1)
+
+    delta = np.zeros(len(df), dtype=float)
+    delta[aplicavel] = np.where(excesso > 0, excesso, 0.0)
+
+    df['Severidade'] = severidade
+    df['Status'] = pd.Categorical.from_codes(severidade - SEVERIDADE_NAO_APLICAVEL, categories=list(tabela_limites.status))
+    df['Delta'] = delta
+
+    # Adiciona o nome em português (os parâmetros sem tradução mantêm o nome original)
+    df['Parâmetro (Português)'] = df['Parameter'].map(traducoes).fillna(df['Parameter'])
+
+    return df
+
+
+# --- Função de Leitura e Limpeza (Independente do Perfil de Tolerância) ---
+def ler_relatorio(uploaded_file):
+    """
+    Lê o arquivo nos formatos simplificado ou complexo e faz a limpeza comum aos dois.
+    Retorna (df_limpo, all_raw_parameters), ou None se não houver linhas; lança ValueError
+    se o arquivo não puder ser lido em nenhum dos dois formatos.
+    """
+    
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    df_limpo = pd.DataFrame()
+    is_simplified = False
+    
+    # 1. TENTA LER O ARQUIVO NO FORMATO SIMPLIFICADO
+    try:
+        uploaded_file.seek(0)
+        
+        if file_extension == 'csv':
+            df_read = pd.read_csv(uploaded_file, sep=',', header=SIMPLIFIED_HEADER_ROW, engine='python', on_bad_lines='skip', nrows=MAX_ROWS_TO_READ, encoding='latin1')
+        elif file_extension == 'xlsx':
+            df_read = pd.read_excel(uploaded_file, header=SIMPLIFIED_HEADER_ROW, sheet_name=0, nrows=MAX_ROWS_TO_READ)
+
+        df_read.columns = df_read.columns.str.strip() 
+        is_simplified = all(col in df_read.columns for col in ['Peak Lat', 'Peak Long', 'KM', 'Parameter'])
+        
+        if is_simplified:
+            df_limpo = df_read[df_read.columns.intersection(SIMPLIFIED_REQUIRED_COLS)].copy()
+            # MANTÉM AS COLUNAS SEPARADAS E AS LIMPA
+            for col in ['Peak Lat', 'Peak Long']:
+                if col in df_limpo.columns:
+                    df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+            df_limpo = df_limpo.rename(columns={'Value': 'Value_26'}) 
+            
+        else:
+            pass
+            
+    except Exception:
+        is_simplified = False
+
+
+    # 2. TENTA LER O ARQUIVO NO FORMATO COMPLEXO
+    if not is_simplified:
+        try:
+            uploaded_file.seek(0) 
+
+            if file_extension == 'csv':
+                df = pd.read_csv(uploaded_file, sep=',', header=COMPLEX_HEADER_ROW, engine='python', on_bad_lines='skip', nrows=MAX_ROWS_TO_READ, encoding='latin1')
+            elif file_extension == 'xlsx':
+                df = pd.read_excel(uploaded_file, header=COMPLEX_HEADER_ROW, sheet_name=0, nrows=MAX_ROWS_TO_READ)
+
+            colunas_para_selecionar = list(COMPLEX_COL_MAP.keys())
+            df_limpo = df.iloc[:, colunas_para_selecionar].copy()
+            df_limpo.columns = COMPLEX_COL_MAP.values()
+            
+            # NO FORMATO COMPLEXO, DIVIDE Peak Lat/Long em duas colunas
+            df_limpo[['Peak Lat', 'Peak Long']] = df_limpo['Peak Lat/Long'].str.split(',', expand=True)
+            df_limpo = df_limpo.drop(columns=['Peak Lat/Long'], errors='ignore')
+            
+            # Limpa e converte as novas colunas de Lat/Long
+            for col in ['Peak Lat', 'Peak Long']:
+                 df_limpo[col] = df_limpo[col].astype(str).str.strip().str.replace(' ', '').str.replace(',', '.').str.replace('|', '', regex=False)
+                 df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+
+        except Exception as complex_e:
+            raise ValueError(f"Erro Crítico ao processar arquivo nos dois formatos. Verifique o cabeçalho. Detalhe: {complex_e}") from complex_e
+
+    # --- Lógica de Limpeza Comum aos DOIS Formatos (Continuada) ---
+    if df_limpo.empty: return None
+    
+    all_raw_parameters = df_limpo['Parameter'].astype(str).str.strip().unique().tolist()
+    
+    df_limpo = df_limpo.dropna(subset=['Parameter'])
+    df_limpo['Parameter'] = df_limpo['Parameter'].astype(str).str.strip()
+
+    value_cols = [col for col in df_limpo.columns if col.startswith('Value_')]
+    
+    for col in value_cols:
+        df_limpo[col] = df_limpo[col].astype(str).str.replace(' ', '').str.replace(',', '.').str.strip()
+        df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+        
+    # Value = primeiro valor numérico entre Value_26, Value_27 e Value_28 (nessa ordem)
+    df_limpo['Value'] = df_limpo[value_cols].bfill(axis=1).iloc[:, 0]
+    
+    df_limpo['KM'] = pd.to_numeric(df_limpo['KM'], errors='coerce').fillna(0).astype(int)
+    df_limpo['M'] = pd.to_numeric(df_limpo['M'], errors='coerce').fillna(0).astype(int)
+    df_limpo['Localização'] = df_limpo['KM'].astype(str) + '+' + df_limpo['M'].astype(str).str.zfill(3)
+    
+    df_limpo = df_limpo.drop(columns=value_cols, errors='ignore')
+
+    return df_limpo, all_raw_parameters
+
+
+# --- Aplicação do Perfil sobre o Relatório Lido ---
+def analisar_relatorio(df_limpo, tabela_limites, traducoes, ignorados):
+    """
+    Remove os parâmetros ignorados e as medições sem 'Value' e aplica a tabela de limites da classe.
+    Retorna o DataFrame analisado e 'rows_before_value_filter' (linhas antes do filtro de 'Value').
+    """
+    # Os parâmetros ignorados saem antes da contagem de 'rows_before_value_filter'
+    df_limpo = df_limpo[~df_limpo['Parameter'].isin(ignorados)].copy()
+    
+    rows_before_value_filter = len(df_limpo)
+    
+    df_limpo = df_limpo.dropna(subset=['Value'])
+
+    df_limpo_analisado = check_conformity(df_limpo, tabela_limites, traducoes)
+    
+    # 3. Reconstrói Peak Lat/Long para exibição
+    # Isso é importante para que as colunas 'Peak Lat' e 'Peak Long' existam no DataFrame final
+    df_limpo_analisado['Peak Lat/Long'] = df_limpo_analisado['Peak Lat'].round(6).astype(str) + ',' + df_limpo_analisado['Peak Long'].round(6).astype(str)
+
+    return df_limpo_analisado, rows_before_value_filter
@@ -0,0 +1,178 @@
+"""
+Teste de carga: N sessões simultâneas do app (streamlit.testing.v1.AppTest) abrindo o
+mesmo relatório. Para cada N informa o pico de memória alocada (tracemalloc) acima do
+estado com os caches já preenchidos, por sessão, e a latência das sessões.
+
+As sessões rodam em threads de um único processo, como no servidor do Streamlit, e
+disputam o mesmo GIL: a latência cresce com N em qualquer versão do app. O número que
+importa é a comparação com uma versão de referência medida na mesma máquina, com
+--revisao (a revisão do git é extraída em um diretório temporário e o app.py dela é
+medido com o mesmo relatório, cada versão em um processo próprio).
+
+Uso (na raiz do repositório):
+    python tests/carga_sessoes.py --sessoes 1 4 8 --linhas 11000
+    python tests/carga_sessoes.py --sessoes 1 4 8 --revisao 21baf4c
+
+Não faz parte do pytest: o resultado depende da máquina.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from pipeline import ler_arquivo_perfil
+
+# Script de cada sessão: o st.file_uploader devolve sempre o relatório gerado
+SCRIPT_SESSAO = """
+import runpy, sys
+import streamlit as st
+from streamlit.proto.Common_pb2 import FileURLs
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+
+sys.path.insert(0, {raiz!r})
+with open({relatorio!r}, 'rb') as f:
+    dados = f.read()
+st.file_uploader = lambda *args, **kwargs: UploadedFile(UploadedFileRec('carga', 'relatorio.csv', 'text/csv', dados), FileURLs())
+runpy.run_path({app!r}, run_name='__main__')
+"""
+
+
+def gerar_relatorio(caminho, linhas, semente=0):
+    """ Relatório sintético no formato simplificado, com os parâmetros do perfil NBR 16387. """
+    perfil = ler_arquivo_perfil(os.path.join(RAIZ, 'perfis', 'nbr16387.yaml'))
+    parametros = list(perfil['limites'][perfil['classe_padrao']])
+    aleatorio = random.Random(semente)
+    saida = ['KM,M,Parameter,Value,Length,Speed,TSC,Track,Peak Lat,Peak Long']
+    for _ in range(linhas):
+        saida.append(
+            f"{aleatorio.randint(0, 50)},{aleatorio.randint(0, 999)},{aleatorio.choice(parametros)},"
+            f"{aleatorio.uniform(-200, 1700):.2f},3,40,1,T1,"
+            f"{-22.9 + aleatorio.random() / 10:.6f},{-43.2 + aleatorio.random() / 10:.6f}"
+        )
+    with open(caminho, 'w', encoding='latin1') as f:
+        f.write('\n'.join(saida))
+
+
+def sessao(script, latencias):
+    """ Uma sessão: abre o app com o relatório e troca o mapa para a nuvem completa de pontos. """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_string(script, default_timeout=300)
+    inicio = time.perf_counter()
+    at.run()
+    modo_mapa = next(r for r in at.radio if r.label.startswith('Modo de Visualização'))
+    modo_mapa.set_value("Nuvem Completa de Pontos (Todos os Status)").run()
+    latencias.append(time.perf_counter() - inicio)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+
+def medir(script, n):
+    """ Executa N sessões em paralelo e retorna (pico em bytes, latências em segundos). """
+    tracemalloc.reset_peak()
+    memoria_inicial = tracemalloc.get_traced_memory()[0]
+    latencias = []
+    threads = [threading.Thread(target=sessao, args=(script, latencias)) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if len(latencias) != n:
+        raise RuntimeError("Nem todas as sessões terminaram; veja o erro acima.")
+    return tracemalloc.get_traced_memory()[1] - memoria_inicial, latencias
+
+
+def medir_app(raiz_app, relatorio, sessoes):
+    """ Mede o app.py de 'raiz_app' para cada N. Retorna [(n, pico em MiB, lat. média, lat. máx.)]. """
+    script = SCRIPT_SESSAO.format(raiz=raiz_app, relatorio=relatorio, app=os.path.join(raiz_app, 'app.py'))
+
+    # O app lê o logo pelo caminho relativo
+    os.chdir(raiz_app)
+    tracemalloc.start()
+
+    # Aquecimento: preenche os caches compartilhados, como a primeira sessão do servidor
+    sessao(script, [])
+
+    resultados = []
+    for n in sessoes:
+        pico, latencias = medir(script, n)
+        resultados.append((n, pico / 2**20, sum(latencias) / n, max(latencias)))
+    return resultados
+
+
+def medir_em_processo(raiz_app, relatorio, sessoes):
+    """ Mede uma versão em um processo próprio: módulos e caches do Streamlit não se misturam entre versões. """
+    comando = [sys.executable, os.path.abspath(__file__), '--app', raiz_app, '--relatorio', relatorio,
+               '--sessoes', *map(str, sessoes)]
+    saida = subprocess.run(comando, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return [tuple(linha) for linha in json.loads(saida.strip().splitlines()[-1])]
+
+
+def extrair_revisao(revisao, destino):
+    """ Extrai a árvore da revisão do git (app.py, logo e módulos da época) em 'destino'. """
+    arquivo = subprocess.run(['git', '-C', RAIZ, 'archive', '--format=tar', revisao], check=True, stdout=subprocess.PIPE).stdout
+    with tarfile.open(fileobj=io.BytesIO(arquivo)) as tar:
+        tar.extractall(destino, filter='data')
+    return destino
+
+
+def imprimir(resultados):
+    print(f"{'N':>4} {'pico (MiB)':>11} {'MiB/sessão':>11} {'lat. média (s)':>15} {'lat. máx. (s)':>14}")
+    for n, pico, media, maxima in resultados:
+        print(f"{n:>4} {pico:>11.1f} {pico / n:>11.1f} {media:>15.2f} {maxima:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessoes', type=int, nargs='+', default=[1, 4, 8], help="Quantidades de sessões simultâneas.")
+    parser.add_argument('--linhas', type=int, default=11000, help="Linhas do relatório sintético.")
+    parser.add_argument('--revisao', help="Revisão do git medida como referência, com o mesmo relatório (ex.: 21baf4c).")
+    # Uso interno: mede uma única versão e imprime o resultado em JSON
+    parser.add_argument('--app', help=argparse.SUPPRESS)
+    parser.add_argument('--relatorio', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore')
+
+    if args.app:
+        print(json.dumps(medir_app(args.app, args.relatorio, args.sessoes)))
+        return
+
+    with tempfile.TemporaryDirectory() as temporario:
+        # Arquivos Arrow do teste ficam isolados do diretório de dados do usuário
+        os.environ['RTGA_DADOS_DIR'] = os.path.join(temporario, 'dados')
+        relatorio = os.path.join(temporario, 'relatorio.csv')
+        gerar_relatorio(relatorio, args.linhas)
+        print(f"Relatório sintético: {args.linhas} linhas")
+
+        if not args.revisao:
+            imprimir(medir_app(RAIZ, relatorio, args.sessoes))
+            return
+
+        referencia = medir_em_processo(extrair_revisao(args.revisao, os.path.join(temporario, 'revisao')), relatorio, args.sessoes)
+        atual = medir_em_processo(RAIZ, relatorio, args.sessoes)
+        print(f"\nReferência ({args.revisao}):")
+        imprimir(referencia)
+        print("\nÁrvore atual:")
+        imprimir(atual)
+        print("\nAtual / referência (MiB/sessão, lat. média):")
+        for (n, pico_ref, media_ref, _), (_, pico, media, _) in zip(referencia, atual):
+            print(f"{n:>4} {pico / pico_ref if pico_ref else float('nan'):>11.2f} {media / media_ref:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
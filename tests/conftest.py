@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# Os testes importam o pipeline a partir da raiz do repositório (o app não é um pacote instalável)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--vazao', action='store_true', help="Executa também os testes de vazão (@pytest.mark.vazao).")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "vazao: mede a vazão dos motores de conformidade (só com --vazao)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--vazao'):
+        return
+    pular = pytest.mark.skip(reason="teste de vazão: execute com --vazao")
+    for item in items:
+        if 'vazao' in item.keywords:
+            item.add_marker(pular)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def diretorio_de_dados(tmp_path_factory):
+    """ Os arquivos Arrow dos testes ficam em um diretório temporário, nunca no do usuário. """
+    import armazenamento
+    armazenamento.ARQUIVOS_ARROW_DIR = str(tmp_path_factory.mktemp('dados'))
+    return armazenamento.ARQUIVOS_ARROW_DIR
@@ -0,0 +1,137 @@
+"""
+Oráculo de referência: a leitura e a análise de conformidade originais do RTGA
+(linha a linha, antes da tabela de limites compilada), congeladas aqui para que
+qualquer motor novo possa ser comparado com elas. NÃO altere este arquivo para
+acompanhar mudanças do pipeline: ele é a definição do resultado esperado.
+
+Diferenças em relação ao app original, apenas de interface:
+  - LIMITS_MAP, PARAMETER_TRANSLATIONS e IGNORED_PARAMETERS viram argumentos;
+  - o erro de leitura nos dois formatos retorna (None, None, None) sem st.error.
+"""
+import pandas as pd
+
+COMPLEX_COL_MAP = {
+    0: 'KM', 3: 'M', 8: 'Parameter',
+    26: 'Value_26', 27: 'Value_27', 28: 'Value_28',
+    31: 'Length', 39: 'Speed', 44: 'TSC', 55: 'Track', 62: 'Peak Lat/Long'
+}
+COMPLEX_HEADER_ROW = 4
+
+SIMPLIFIED_REQUIRED_COLS = ['KM', 'M', 'Parameter', 'Value', 'Length', 'Speed', 'TSC', 'Track', 'Peak Lat', 'Peak Long']
+SIMPLIFIED_HEADER_ROW = 0
+
+MAX_ROWS_TO_READ = 11000
+
+
+def check_conformity(df, tolerance_limits, translations):
+    """ Adiciona a coluna 'Status' e 'Delta' ao DataFrame baseado nos limites fornecidos. """
+    df['Status'] = 'Não Aplicável'
+    df['Delta'] = 0.0
+
+    df['Parâmetro (Português)'] = df['Parameter'].apply(lambda p: translations.get(p, p))
+
+    for param, limits in tolerance_limits.items():
+        mask = df['Parameter'] == param
+        if df.loc[mask].empty: continue
+
+        value_to_check = df.loc[mask, 'Value']
+
+        if limits['check'] == 'max':
+            df.loc[mask, 'Status'] = df.loc[mask, 'Value'].apply(lambda x: 'Fora do Limite' if x > limits['max'] else 'Em Conformidade (Próximo)')
+            df.loc[mask, 'Delta'] = df.loc[mask, 'Value'].apply(lambda x: x - limits['max'] if x > limits['max'] else 0)
+        elif limits['check'] == 'min':
+            df.loc[mask, 'Status'] = df.loc[mask, 'Value'].apply(lambda x: 'Fora do Limite' if x < limits['min'] else 'Em Conformidade (Próximo)')
+            df.loc[mask, 'Delta'] = df.loc[mask, 'Value'].apply(lambda x: limits['min'] - x if x < limits['min'] else 0)
+        elif limits['check'] == 'abs_max':
+            df.loc[mask, 'Status'] = value_to_check.apply(lambda x: 'Fora do Limite' if abs(x) > limits['max'] else 'Em Conformidade (Próximo)')
+            df.loc[mask, 'Delta'] = value_to_check.apply(lambda x: abs(x) - limits['max'] if abs(x) > limits['max'] else 0)
+
+    df['Parâmetro (Português)'] = df['Parâmetro (Português)'].fillna(df['Parameter'])
+
+    return df
+
+
+def processar_dados_ferrovia(uploaded_file, tolerance_limits, translations, ignored_parameters):
+    """ Leitura, limpeza e análise originais. Retorna (df_analisado, rows_before_value_filter, all_raw_parameters). """
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    df_limpo = pd.DataFrame()
+    is_simplified = False
+
+    # 1. TENTA LER O ARQUIVO NO FORMATO SIMPLIFICADO
+    try:
+        uploaded_file.seek(0)
+
+        if file_extension == 'csv':
+            df_read = pd.read_csv(uploaded_file, sep=',', header=SIMPLIFIED_HEADER_ROW, engine='python', on_bad_lines='skip', nrows=MAX_ROWS_TO_READ, encoding='latin1')
+        elif file_extension == 'xlsx':
+            df_read = pd.read_excel(uploaded_file, header=SIMPLIFIED_HEADER_ROW, sheet_name=0, nrows=MAX_ROWS_TO_READ)
+
+        df_read.columns = df_read.columns.str.strip()
+        is_simplified = all(col in df_read.columns for col in ['Peak Lat', 'Peak Long', 'KM', 'Parameter'])
+
+        if is_simplified:
+            df_limpo = df_read[df_read.columns.intersection(SIMPLIFIED_REQUIRED_COLS)].copy()
+            for col in ['Peak Lat', 'Peak Long']:
+                if col in df_limpo.columns:
+                    df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+            df_limpo = df_limpo.rename(columns={'Value': 'Value_26'})
+
+    except Exception:
+        is_simplified = False
+
+    # 2. TENTA LER O ARQUIVO NO FORMATO COMPLEXO
+    if not is_simplified:
+        try:
+            uploaded_file.seek(0)
+
+            if file_extension == 'csv':
+                df = pd.read_csv(uploaded_file, sep=',', header=COMPLEX_HEADER_ROW, engine='python', on_bad_lines='skip', nrows=MAX_ROWS_TO_READ, encoding='latin1')
+            elif file_extension == 'xlsx':
+                df = pd.read_excel(uploaded_file, header=COMPLEX_HEADER_ROW, sheet_name=0, nrows=MAX_ROWS_TO_READ)
+
+            colunas_para_selecionar = list(COMPLEX_COL_MAP.keys())
+            df_limpo = df.iloc[:, colunas_para_selecionar].copy()
+            df_limpo.columns = COMPLEX_COL_MAP.values()
+
+            df_limpo[['Peak Lat', 'Peak Long']] = df_limpo['Peak Lat/Long'].str.split(',', expand=True)
+            df_limpo = df_limpo.drop(columns=['Peak Lat/Long'], errors='ignore')
+
+            for col in ['Peak Lat', 'Peak Long']:
+                 df_limpo[col] = df_limpo[col].astype(str).str.strip().str.replace(' ', '').str.replace(',', '.').str.replace('|', '', regex=False)
+                 df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+
+        except Exception:
+            return None, None, None
+
+    # --- Lógica de Limpeza Comum aos DOIS Formatos ---
+    if df_limpo.empty: return None, None, None
+
+    all_raw_parameters = df_limpo['Parameter'].astype(str).str.strip().unique().tolist()
+
+    df_limpo = df_limpo.dropna(subset=['Parameter'])
+    df_limpo['Parameter'] = df_limpo['Parameter'].astype(str).str.strip()
+    df_limpo = df_limpo[~df_limpo['Parameter'].isin(ignored_parameters)].copy()
+
+    value_cols = [col for col in df_limpo.columns if col.startswith('Value_')]
+
+    for col in value_cols:
+        df_limpo[col] = df_limpo[col].astype(str).str.replace(' ', '').str.replace(',', '.').str.strip()
+        df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+
+    df_limpo['Value'] = df_limpo[value_cols].bfill(axis=1).iloc[:, 0]
+
+    rows_before_value_filter = len(df_limpo)
+
+    df_limpo = df_limpo.dropna(subset=['Value'])
+
+    df_limpo['KM'] = pd.to_numeric(df_limpo['KM'], errors='coerce').fillna(0).astype(int)
+    df_limpo['M'] = pd.to_numeric(df_limpo['M'], errors='coerce').fillna(0).astype(int)
+    df_limpo['Localização'] = df_limpo['KM'].astype(str) + '+' + df_limpo['M'].astype(str).str.zfill(3)
+
+    df_limpo = df_limpo.drop(columns=value_cols, errors='ignore')
+
+    df_limpo_analisado = check_conformity(df_limpo, tolerance_limits, translations)
+
+    df_limpo_analisado['Peak Lat/Long'] = df_limpo_analisado['Peak Lat'].round(6).astype(str) + ',' + df_limpo_analisado['Peak Long'].round(6).astype(str)
+
+    return df_limpo_analisado, rows_before_value_filter, all_raw_parameters
@@ -0,0 +1,66 @@
+"""
+Arquivos de trabalho em disco (armazenamento): a versão dos arquivos acompanha o código,
+a limpeza não remove arquivos ainda mapeados e o CSV de download é regenerado se sumir.
+"""
+import gc
+import os
+
+import pandas as pd
+
+import armazenamento
+from armazenamento import abrir_arrow, caminho_arquivo_arrow, exportar_csv, gravar_arrow
+
+COLUNAS = ['Parameter', 'Value']
+
+
+def gravar(chave, linhas=100):
+    caminho = caminho_arquivo_arrow(chave)
+    gravar_arrow(pd.DataFrame({'Parameter': ['Gage Wide'] * linhas, 'Value': [1600.0] * linhas}), caminho, {})
+    return caminho
+
+
+def test_versao_acompanha_o_codigo(monkeypatch, tmp_path):
+    caminho = gravar('versao')
+    assert abrir_arrow(caminho, COLUNAS) is not None
+
+    # Outra versão do pipeline.py gera outra versão, outro caminho, e o arquivo antigo é recusado
+    pipeline_alterado = tmp_path / 'pipeline.py'
+    pipeline_alterado.write_bytes(open(armazenamento.pipeline.__file__, 'rb').read() + b'\n# alterado\n')
+    monkeypatch.setattr(armazenamento.pipeline, '__file__', str(pipeline_alterado))
+    nova_versao = armazenamento.versao_do_codigo()
+    assert nova_versao != armazenamento.VERSAO_ARQUIVOS_ARROW
+
+    monkeypatch.setattr(armazenamento, 'VERSAO_ARQUIVOS_ARROW', nova_versao)
+    assert caminho_arquivo_arrow('versao') != caminho
+    assert abrir_arrow(caminho, COLUNAS) is None
+
+
+def test_limpeza_preserva_arquivos_mapeados(monkeypatch):
+    monkeypatch.setattr(armazenamento, 'MAX_BYTES_ARQUIVOS_ARROW', 0)
+    primeiro = gravar('mapeado')
+    aberto = abrir_arrow(primeiro, COLUNAS)
+
+    gravar('outro')
+    assert os.path.exists(primeiro)
+
+    # Liberada a tabela, a próxima gravação remove o arquivo
+    del aberto
+    gc.collect()
+    gravar('mais um')
+    assert not os.path.exists(primeiro)
+
+
+def test_csv_removido_e_regenerado():
+    tabela, _ = abrir_arrow(gravar('csv'), COLUNAS)
+    dados = exportar_csv('csv', 'perfil', 'Classe 1', tabela)
+    assert dados.decode('utf-8').splitlines()[0] == 'Parameter,Value'
+
+    os.remove(caminho_arquivo_arrow('csv', 'perfil', 'Classe 1', extensao='csv'))
+    assert exportar_csv('csv', 'perfil', 'Classe 1', tabela) == dados
+
+
+def test_marcar_uso_de_arquivo_removido():
+    caminho = gravar('removido')
+    os.remove(caminho)
+    armazenamento.marcar_uso(caminho)
+    assert not os.path.exists(caminho)
@@ -0,0 +1,256 @@
+"""
+Compara o caminho do app (leitura -> Arrow em disco -> análise -> Arrow em disco, em
+armazenamento.py) com o oráculo congelado em tests/oracle.py, sobre relatórios gerados
+pelo Hypothesis nos formatos simplificado, complexo e .xlsx, e mede a vazão de cada
+motor de conformidade (só com --vazao).
+"""
+import hashlib
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from hypothesis import HealthCheck, given, settings, strategies as st
+
+import oracle
+from armazenamento import analise_do_relatorio, leitura_do_relatorio
+from pipeline import SEVERIDADE_NAO_APLICAVEL, check_conformity, ler_arquivo_perfil, ler_relatorio
+
+PERFIL = ler_arquivo_perfil(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'perfis', 'nbr16387.yaml'))
+CLASSES = list(PERFIL['limites'])
+PARAMETROS = sorted({param for limites in PERFIL['limites'].values() for param in limites})
+
+# Parâmetros sem limite: ignorados pelo perfil, desconhecidos, com espaços ou vazios
+PARAMETROS_SEM_LIMITE = PERFIL['ignorados'][:6] + ['Outro Parâmetro', ' Gage Wide ', '']
+
+# Valores exatamente sobre os limites de todas as classes (em conformidade, Delta = 0)
+VALORES_LIMITE = sorted({
+    valor
+    for limites in PERFIL['limites'].values()
+    for limite in limites.values()
+    for valor in (limite['min'], limite['max'], -limite['max'])
+})
+
+# Versão fictícia do perfil: só entra no nome dos arquivos da análise
+VERSAO_PERFIL = ('nbr16387.yaml', 'testes')
+
+CONFIGURACAO = settings(max_examples=150, deadline=None, suppress_health_check=[HealthCheck.too_slow])
+
+
+# --- Estratégias ---
+def com_virgula(texto):
+    """ Número com vírgula decimal, entre aspas para não quebrar a linha do CSV. """
+    return '"' + texto.replace('.', ',') + '"'
+
+
+numero = st.floats(-2000, 2000, allow_nan=False).map(lambda x: f"{x:.3f}")
+limite = st.sampled_from(VALORES_LIMITE).map(lambda x: f"{x:g}")
+valor = st.one_of(
+    numero,
+    numero.map(com_virgula),
+    limite,
+    limite.map(com_virgula),
+    st.sampled_from(['', 'abc', ' 12 ', 'nan']),
+)
+coordenada = st.one_of(st.floats(-23.5, -22.5).map(lambda x: f"{x:.6f}"), st.sampled_from(['', 'x']))
+linha = st.fixed_dictionaries({
+    'km': st.integers(0, 99),
+    'm': st.integers(0, 999),
+    'parametro': st.one_of(st.sampled_from(PARAMETROS), st.sampled_from(PARAMETROS_SEM_LIMITE)),
+    'valores': st.tuples(valor, valor, valor),
+    'lat': coordenada,
+    'long': coordenada,
+    # Linhas com campos a mais são descartadas pelo leitor; com campos a menos, viram nulos
+    'forma': st.sampled_from(['ok', 'ok', 'ok', 'campos_a_mais', 'campos_a_menos']),
+})
+linhas = st.lists(linha, min_size=1, max_size=60)
+
+
+def arquivo_simplificado(linhas):
+    saida = ['KM,M,Parameter,Value,Length,Speed,TSC,Track,Peak Lat,Peak Long']
+    for l in linhas:
+        campos = [str(l['km']), str(l['m']), l['parametro'], l['valores'][0], '3', '40', '1', 'T1', l['lat'], l['long']]
+        saida.append(ajustar_forma(campos, l['forma']))
+    return '\n'.join(saida).encode('latin1')
+
+
+def arquivo_complexo(linhas):
+    saida = ['Relatorio de Geometria'] * oracle.COMPLEX_HEADER_ROW + [','.join(f'c{i}' for i in range(64))]
+    for l in linhas:
+        campos = [''] * 64
+        campos[0], campos[3], campos[8] = str(l['km']), str(l['m']), l['parametro']
+        campos[26], campos[27], campos[28] = l['valores']
+        campos[31], campos[39], campos[44], campos[55] = '3', '40', '1', 'T1'
+        campos[62] = f'"{l["lat"]}, {l["long"]}"'
+        saida.append(ajustar_forma(campos, l['forma']))
+    return '\n'.join(saida).encode('latin1')
+
+
+def ajustar_forma(campos, forma):
+    if forma == 'campos_a_mais':
+        return ','.join(campos + ['extra', 'extra'])
+    if forma == 'campos_a_menos':
+        return ','.join(campos[:4])
+    return ','.join(campos)
+
+
+def arquivo(dados, nome='relatorio.csv'):
+    """ Arquivo em memória com 'name', como o UploadedFile do Streamlit. """
+    f = io.BytesIO(dados)
+    f.name = nome
+    return f
+
+
+# --- Comparação com o Oráculo ---
+def texto(serie):
+    return serie.astype(object).fillna('<NA>').astype(str).tolist()
+
+
+def analise_pelo_app(dados, classe, nome='relatorio.csv'):
+    """ Mesmo caminho de processar_dados_ferrovia: grava e reabre a leitura e a análise em Arrow. """
+    chave = hashlib.sha256(dados).hexdigest()
+    try:
+        leitura = leitura_do_relatorio(chave, arquivo(dados, nome))
+    except ValueError:
+        return None
+    if leitura is None:
+        return None
+    return analise_do_relatorio(chave, VERSAO_PERFIL, classe, PERFIL, lambda: leitura)
+
+
+def comparar_com_oraculo(dados, classe, nome='relatorio.csv'):
+    esperado, rows_before_esperado, raw_esperado = oracle.processar_dados_ferrovia(
+        arquivo(dados, nome), PERFIL['limites'][classe], PERFIL['traducoes'], PERFIL['ignorados']
+    )
+    analise = analise_pelo_app(dados, classe, nome)
+    if esperado is None:
+        assert analise is None
+        return
+
+    tabela_analisada, metadados = analise
+    tabela = PERFIL['tabelas'][classe]
+    obtido = tabela_analisada.to_pandas()
+    esperado = esperado.reset_index(drop=True)
+
+    assert len(obtido) == len(esperado)
+    assert metadados['rows_before_value_filter'] == rows_before_esperado
+    assert texto(pd.Series(metadados['all_raw_parameters'], dtype=object)) == texto(pd.Series(raw_esperado, dtype=object))
+
+    # Todas as colunas do oráculo sobrevivem à ida e volta pelo Arrow (exceto 'Status', com rótulos graduados)
+    for coluna in esperado.columns.drop('Status'):
+        a, b = obtido[coluna], esperado[coluna]
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            assert np.array_equal(a.to_numpy(float), b.to_numpy(float), equal_nan=True), coluna
+        else:
+            assert texto(a) == texto(b), coluna
+
+    severidade = obtido['Severidade'].to_numpy()
+    assert np.array_equal(severidade >= tabela.codigo_limite, (esperado['Status'] == 'Fora do Limite').to_numpy())
+    assert np.array_equal(severidade == SEVERIDADE_NAO_APLICAVEL, (esperado['Status'] == 'Não Aplicável').to_numpy())
+
+
+@CONFIGURACAO
+@given(linhas, st.sampled_from(CLASSES))
+def test_formato_simplificado_igual_ao_oraculo(linhas, classe):
+    comparar_com_oraculo(arquivo_simplificado(linhas), classe)
+
+
+@CONFIGURACAO
+@given(linhas, st.sampled_from(CLASSES))
+def test_formato_complexo_igual_ao_oraculo(linhas, classe):
+    comparar_com_oraculo(arquivo_complexo(linhas), classe)
+
+
+def arquivo_xlsx(linhas):
+    """ Formato simplificado em .xlsx: números como números e colunas com tipos misturados. """
+    df = pd.DataFrame([
+        {
+            'KM': l['km'], 'M': l['m'], 'Parameter': l['parametro'] or None,
+            'Value': numero_ou_texto(l['valores'][0]), 'Length': 3, 'Speed': 40, 'TSC': 1,
+            'Track': l['km'] if l['km'] % 2 else 'T1',
+            'Peak Lat': numero_ou_texto(l['lat']), 'Peak Long': numero_ou_texto(l['long']),
+        }
+        for l in linhas
+    ])
+    saida = io.BytesIO()
+    df.to_excel(saida, index=False)
+    return saida.getvalue()
+
+
+def numero_ou_texto(valor):
+    try:
+        return float(valor)
+    except ValueError:
+        return valor.strip('"') or None
+
+
+@settings(CONFIGURACAO, max_examples=40)
+@given(linhas, st.sampled_from(CLASSES))
+def test_formato_xlsx_igual_ao_oraculo(linhas, classe):
+    comparar_com_oraculo(arquivo_xlsx(linhas), classe, nome='relatorio.xlsx')
+
+
+@pytest.mark.parametrize('classe', CLASSES)
+def test_valor_sobre_o_limite_esta_em_conformidade(classe):
+    linhas = [
+        {'km': 1, 'm': i, 'parametro': param, 'valores': (f"{valor:g}", '', ''), 'lat': '-22.9', 'long': '-43.2', 'forma': 'ok'}
+        for i, (param, limites) in enumerate(PERFIL['limites'][classe].items())
+        for valor in (limites['min'], limites['max'], -limites['max'])
+        if limites['check'] == 'abs_max' or valor != -limites['max']
+    ]
+    comparar_com_oraculo(arquivo_simplificado(linhas), classe)
+
+    obtido = analise_pelo_app(arquivo_simplificado(linhas), classe)[0].to_pandas()
+    assert (obtido['Severidade'] < PERFIL['tabelas'][classe].codigo_limite).all()
+    assert (obtido['Delta'] == 0).all()
+
+
+def test_arquivo_ilegivel_lanca_valueerror():
+    assert oracle.processar_dados_ferrovia(arquivo(b''), {}, {}, []) == (None, None, None)
+    with pytest.raises(ValueError):
+        ler_relatorio(arquivo(b''))
+
+
+# --- Vazão dos Motores de Conformidade ---
+# O motor vetorizado deve ser ao menos esta quantidade de vezes mais rápido que a referência
+ACELERACAO_MINIMA = 1.5
+
+
+@pytest.mark.vazao
+def test_vazao_dos_motores(record_property, capsys):
+    """ Mede linhas/s de cada motor sobre o mesmo relatório sintético, confere os resultados e a aceleração mínima. """
+    rng = np.random.default_rng(0)
+    n = int(os.environ.get('RTGA_LINHAS_VAZAO', '200000'))
+    classe = PERFIL['classe_padrao']
+    df = pd.DataFrame({
+        'Parameter': rng.choice(PARAMETROS + PARAMETROS_SEM_LIMITE, n),
+        'Value': rng.uniform(-200, 1700, n),
+    })
+
+    motores = {
+        'referencia': lambda d: oracle.check_conformity(d, PERFIL['limites'][classe], PERFIL['traducoes']),
+        'vetorizado': lambda d: check_conformity(d, PERFIL['tabelas'][classe], PERFIL['traducoes']),
+    }
+    resultados, vazao = {}, {}
+    for nome, motor in motores.items():
+        # Melhor de 3 execuções, para reduzir o ruído da máquina
+        duracao = float('inf')
+        for _ in range(3):
+            entrada = df.copy()
+            inicio = time.perf_counter()
+            resultados[nome] = motor(entrada)
+            duracao = min(duracao, time.perf_counter() - inicio)
+        vazao[nome] = n / duracao
+        record_property(f'linhas_por_segundo_{nome}', round(vazao[nome]))
+        with capsys.disabled():
+            print(f"\n[vazão] {nome}: {vazao[nome]:,.0f} linhas/s ({n} linhas)")
+
+    referencia, vetorizado = resultados['referencia'], resultados['vetorizado']
+    assert np.array_equal(referencia['Delta'].to_numpy(float), vetorizado['Delta'].to_numpy(float))
+    assert np.array_equal(
+        (referencia['Status'] == 'Fora do Limite').to_numpy(),
+        vetorizado['Severidade'].to_numpy() >= PERFIL['tabelas'][classe].codigo_limite,
+    )
+    assert vazao['vetorizado'] >= ACELERACAO_MINIMA * vazao['referencia'], vazao
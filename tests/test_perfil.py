@@ -0,0 +1,88 @@
+"""
+Validação dos perfis de tolerância (pipeline.validar_perfil): cada erro de estrutura
+deve ser recusado ao carregar o arquivo, com a mensagem do problema.
+"""
+import copy
+
+import pytest
+
+from pipeline import validar_perfil
+
+PERFIL_MINIMO = {
+    'classes': {
+        'Classe 1': {
+            'Gage Wide': {'min': 1600, 'max': 1632, 'check': 'max'},
+            'Gage Narrow': {'min': 1587, 'max': 1600, 'check': 'min'},
+            'Crosslevel': {'min': 0, 'max': 57, 'check': 'abs_max'},
+        },
+    },
+}
+
+
+def perfil(**alteracoes):
+    """ Cópia do perfil mínimo válido com as chaves de topo substituídas. """
+    dados = copy.deepcopy(PERFIL_MINIMO)
+    dados.update(alteracoes)
+    return dados
+
+
+def com_limite(chave, valor):
+    dados = perfil()
+    dados['classes']['Classe 1']['Gage Wide'][chave] = valor
+    return dados
+
+
+def test_perfil_minimo_e_valido():
+    validar_perfil(perfil())
+
+
+@pytest.mark.parametrize('dados, mensagem', [
+    (com_limite('min', float('nan')), "'min' deve ser um número finito"),
+    (com_limite('max', float('nan')), "'max' deve ser um número finito"),
+    (com_limite('max', float('inf')), "'max' deve ser um número finito"),
+    (com_limite('min', float('-inf')), "'min' deve ser um número finito"),
+    (com_limite('max', '1632'), "'max' deve ser um número finito"),
+    (perfil(classes=[1]), "'classes' deve ser um mapeamento"),
+    (perfil(classes={}), "'classes' é obrigatória"),
+    (perfil(severidade=[{'nome': 'Fora do Limite', 'fracao': 1.0, 'cor': 'vermelho'}]), "não é uma cor válida"),
+    (perfil(severidade=[{'nome': 'Fora do Limite', 'fracao': float('inf')}]), "'fracao' deve ser um número positivo"),
+])
+def test_perfil_invalido_e_recusado(dados, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        validar_perfil(dados)
+
+
+@pytest.mark.parametrize('cor', ['gold', '#ff0000', 'rgb(255, 0, 0)', None])
+def test_cores_aceitas(cor):
+    validar_perfil(perfil(severidade=[{'nome': 'Fora do Limite', 'fracao': 1.0, 'cor': cor}]))
+
+
+def niveis(*fracoes, nomes=None):
+    nomes = nomes or [f"Nível {i}" for i in range(len(fracoes))]
+    return [{'nome': nome, 'fracao': fracao} for nome, fracao in zip(nomes, fracoes)]
+
+
+def com_faixa(param, minimo, maximo, **alteracoes):
+    dados = perfil(**alteracoes)
+    dados['classes']['Classe 1'][param].update({'min': minimo, 'max': maximo})
+    return dados
+
+
+@pytest.mark.parametrize('dados, mensagem', [
+    (com_faixa('Gage Wide', 1632, 1632), "faixa de tolerância nula"),
+    (com_faixa('Crosslevel', 0, 0), "faixa de tolerância nula"),
+    (com_faixa('Gage Wide', 1632, 1632, severidade=niveis(1.0, 1.5)), "faixa de tolerância nula"),
+    (perfil(severidade=niveis(0.8, 1.2)), "'fracao: 1.0'"),
+    (perfil(severidade=niveis(1.0, 0.8)), "ordem crescente"),
+    (perfil(severidade=niveis(0.8, 1.0, 1.0)), "ordem crescente"),
+    (perfil(severidade=niveis(0.8, 1.0, nomes=['Fora', 'Fora'])), "devem ser únicos"),
+    (perfil(severidade=niveis(0.8, 1.0, nomes=['Em Conformidade', 'Fora'])), "devem ser únicos"),
+    (perfil(severidade=[]), "lista de níveis"),
+])
+def test_niveis_invalidos_sao_recusados(dados, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        validar_perfil(dados)
+
+
+def test_faixa_nula_aceita_so_com_o_nivel_do_limite():
+    validar_perfil(com_faixa('Gage Wide', 1632, 1632, severidade=niveis(1.0)))
@@ -0,0 +1,90 @@
+"""
+Níveis de severidade graduados (pipeline.check_conformity sobre a tabela compilada):
+o código de cada linha deve ser o np.digitize do excesso sobre os limiares do parâmetro,
+e um valor exatamente sobre o limiar exibido de um nível ainda não o atinge.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from pipeline import CASAS_DECIMAIS_LIMIARES, SEVERIDADE_NAO_APLICAVEL, check_conformity, ler_arquivo_perfil
+
+PERFIL = ler_arquivo_perfil(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'perfis', 'nbr16387.yaml'))
+CLASSES = list(PERFIL['limites'])
+PARAMETROS = sorted({param for limites in PERFIL['limites'].values() for param in limites})
+
+
+def excesso_esperado(valor, limites):
+    """ Excesso ao limite calculado diretamente das regras do perfil (positivo = Fora do Limite). """
+    if limites['check'] == 'max':
+        return valor - limites['max']
+    if limites['check'] == 'min':
+        return limites['min'] - valor
+    return abs(valor) - limites['max']
+
+
+def severidade(classe, parametros, valores):
+    df = pd.DataFrame({'Parameter': parametros, 'Value': np.asarray(valores, dtype=float)})
+    return check_conformity(df, PERFIL['tabelas'][classe], PERFIL['traducoes'])['Severidade'].to_numpy()
+
+
+@settings(max_examples=200, deadline=None)
+@given(
+    st.sampled_from(CLASSES),
+    st.lists(
+        st.tuples(
+            st.sampled_from(PARAMETROS + ['Outro Parâmetro']),
+            st.floats(-2000, 2000, allow_nan=False).map(lambda x: round(x, 3)),
+        ),
+        min_size=1, max_size=80,
+    ),
+)
+def test_severidade_igual_a_digitize(classe, linhas):
+    tabela = PERFIL['tabelas'][classe]
+    parametros, valores = zip(*linhas)
+    obtido = severidade(classe, parametros, valores)
+
+    for param, valor, codigo in zip(parametros, valores, obtido):
+        limites = PERFIL['limites'][classe].get(param)
+        if limites is None:
+            assert codigo == SEVERIDADE_NAO_APLICAVEL
+            continue
+        excesso = round(excesso_esperado(valor, limites), CASAS_DECIMAIS_LIMIARES)
+        limiares = tabela.limiares[tabela.parametros.get_loc(param)]
+        assert codigo == np.digitize(excesso, limiares, right=True), (param, valor)
+
+
+def gatilhos(classe):
+    """ (parâmetro, índice do nível, valor exibido como gatilho, sinal de violação) para os níveis != 1.0. """
+    for param, limites in PERFIL['limites'][classe].items():
+        faixa = limites['max'] if limites['check'] == 'abs_max' else limites['max'] - limites['min']
+        for indice, nivel in enumerate(PERFIL['severidade'], start=1):
+            if nivel['fracao'] == 1.0:
+                continue
+            # Valor do gatilho escrito como na tabela de limites (ex.: "> 1638.4 mm")
+            deslocamento = (nivel['fracao'] - 1.0) * faixa
+            if limites['check'] == 'max':
+                yield param, indice, float(f"{limites['max'] + deslocamento:g}"), 1
+            elif limites['check'] == 'min':
+                yield param, indice, float(f"{limites['min'] - deslocamento:g}"), -1
+            else:
+                gatilho = float(f"{limites['max'] + deslocamento:g}")
+                yield param, indice, gatilho, 1
+                yield param, indice, -gatilho, -1
+
+
+@pytest.mark.parametrize('classe', CLASSES)
+def test_valor_sobre_o_gatilho_nao_atinge_o_nivel(classe):
+    casos = list(gatilhos(classe))
+    assert {PERFIL['severidade'][indice - 1]['fracao'] for _, indice, _, _ in casos} == {0.8, 1.2}
+
+    parametros = [param for param, _, _, _ in casos]
+    sobre = severidade(classe, parametros, [gatilho for _, _, gatilho, _ in casos])
+    alem = severidade(classe, parametros, [gatilho + 0.001 * sinal for _, _, gatilho, sinal in casos])
+
+    for (param, indice, gatilho, _), no_gatilho, apos in zip(casos, sobre, alem):
+        assert no_gatilho == indice - 1, (param, gatilho)
+        assert apos == indice, (param, gatilho)